@@ -0,0 +1,95 @@
+import os
+import math
+import time
+import threading
+import logging
+from metricas import counter, gauge
+
+logger = logging.getLogger("admision")
+
+# Límites de admisión de solicitudes RPC
+MAX_IN_FLIGHT = int(os.environ.get('MAX_IN_FLIGHT', 64))  # RPC en curso por proceso (0 = sin límite)
+MAX_QUEUE_DEPTH = int(os.environ.get('MAX_QUEUE_DEPTH', 1000))  # Mensajes en rpc_queue a partir de los que se rechaza (0 = sin límite)
+QUEUE_PROBE_INTERVAL = float(os.environ.get('QUEUE_PROBE_INTERVAL', 1.0))  # Segundos entre sondeos de la cola
+ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER', 1))  # Segundos sugeridos en Retry-After
+
+# Métricas de admisión
+ADMITTED_IN_FLIGHT = gauge('textpro_admission_in_flight', "Solicitudes admitidas en curso en este proceso")
+ADMISSION_REJECTED = counter('textpro_admission_rejected_total', "Solicitudes rechazadas por sobrecarga", ('reason',))
+
+# Control de admisión con rechazo rápido
+class AdmissionController(object):
+    """Límite de RPC en curso por proceso y sondeo periódico de la profundidad de la cola RPC"""
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, max_queue_depth=MAX_QUEUE_DEPTH, probe=None,
+                 probe_interval=QUEUE_PROBE_INTERVAL, retry_after=ADMISSION_RETRY_AFTER, rpc_in_flight=None):
+        self.max_in_flight = max_in_flight
+        # rpc_in_flight() devuelve las RPC del proceso que esperan respuesta sin una petición HTTP abierta
+        # (p. ej. trabajos asíncronos), que también cuentan para el límite
+        self.rpc_in_flight = rpc_in_flight
+        self.max_queue_depth = max_queue_depth
+        # probe() devuelve los mensajes pendientes en la cola RPC, o None si no se sabe
+        self.probe = probe
+        self.probe_interval = probe_interval
+        self.retry_after = retry_after
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._depth = None
+        self._probed_at = None
+
+    def acquire(self):
+        """Reservar un hueco; devuelve None si se admite o (estado HTTP, Retry-After, motivo) si no"""
+        with self._lock:
+            if self.max_in_flight and (self._in_flight >= self.max_in_flight or
+                                       (self.rpc_in_flight and self.rpc_in_flight() >= self.max_in_flight)):
+                ADMISSION_REJECTED.labels("in_flight").inc()
+                return 429, self.retry_after, "Demasiadas solicitudes en curso, inténtalo de nuevo en unos segundos"
+            self._in_flight += 1
+            ADMITTED_IN_FLIGHT.inc()
+
+        depth = self.queue_depth() if self.max_queue_depth else None
+        if depth is not None and depth >= self.max_queue_depth:
+            self.release()
+            ADMISSION_REJECTED.labels("queue_depth").inc()
+            # Cuanto más llena la cola, más tarde conviene reintentar
+            retry_after = max(self.retry_after, math.ceil(self.retry_after * depth / self.max_queue_depth))
+            return 503, retry_after, "El servidor RPC está saturado, inténtalo de nuevo en unos segundos"
+        return None
+
+    def release(self):
+        """Liberar un hueco reservado con acquire()"""
+        with self._lock:
+            self._in_flight -= 1
+            ADMITTED_IN_FLIGHT.dec()
+
+    def queue_depth(self):
+        """Profundidad de la cola RPC, sondeada como mucho una vez por intervalo"""
+        now = time.monotonic()
+        if self.probe is None:
+            return None
+        if self._probed_at is not None and now - self._probed_at < self.probe_interval:
+            return self._depth
+        # Un solo hilo sondea; los demás usan el último valor conocido
+        if not self._probe_lock.acquire(blocking=False):
+            return self._depth
+        try:
+            self._depth = self.probe()
+        except Exception as e:
+            # Ante un fallo del sondeo se admite: el timeout sigue protegiendo la petición
+            logger.warning(f"No se pudo consultar la profundidad de la cola: {str(e)}")
+            self._depth = None
+        finally:
+            self._probed_at = time.monotonic()
+            self._probe_lock.release()
+        return self._depth
+
+    def stats(self):
+        """Estado de la admisión"""
+        return {
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": self._depth,
+            "max_queue_depth": self.max_queue_depth,
+            "rejected_in_flight": ADMISSION_REJECTED.labels("in_flight").value,
+            "rejected_queue_depth": ADMISSION_REJECTED.labels("queue_depth").value
+        }
@@ -1,14 +1,26 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash
+from flask import (Flask, render_template, request, jsonify, redirect, url_for, session, flash, Response,
+                   stream_with_context, make_response)
+from werkzeug.utils import secure_filename
 import os
-import datetime
+import asyncio
+import functools
+import inspect
+import itertools
 import json
-from time import sleep
 import logging
 import threading
+import uuid
 
 # Importar cliente y servidor
-from cliente import RPC_CLIENT, init_client, get_client_status
-from server import TEXT_OPERATIONS, get_server_status, init_server
+from cliente import (RPC_CLIENT, RPC_QUEUE, client_in_flight, client_queue_depth, init_client, get_client_status,
+                     get_async_client, get_rpc_client)
+from server import TEXT_OPERATIONS, PIPELINE_SEPARATOR, get_server_status, init_server
+from operaciones import CHUNK_MAP, chunking_mode, get_operation, iter_chunks
+from metricas import render_metrics
+from trazas import TRACES
+from admision import AdmissionController
+from trabajos import JOB_PENDING, JobStore
+from historial import HISTORY_PAGE_SIZE, HistoryStore
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, 
@@ -18,20 +30,100 @@ logger = logging.getLogger("app")
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
 
+# Tiempo máximo de espera por una respuesta RPC (segundos)
+RPC_TIMEOUT = 10
+
+# Tamaño de fragmento (caracteres) del modo streaming
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', 64 * 1024))
+
+# Máximo de elementos aceptados en /process/batch
+MAX_BATCH_ITEMS = int(os.environ.get('MAX_BATCH_ITEMS', 10000))
+
+# Espera máxima de una consulta long-poll de /jobs/<id> (segundos)
+JOB_POLL_WAIT = float(os.environ.get('JOB_POLL_WAIT', 10))
+
+# Intervalo de los comentarios keep-alive del flujo SSE de /jobs/<id>/events (segundos)
+SSE_KEEPALIVE = float(os.environ.get('SSE_KEEPALIVE', 15))
+
+# Trabajos asíncronos enviados por /jobs
+JOBS = JobStore()
+
+# Historial de operaciones por sesión, guardado en el servidor
+HISTORY = HistoryStore()
+
+# Control de admisión: rechazo rápido si este proceso o la cola RPC están saturados.
+# La sonda solo lee el cliente actual: reconectarlo desde aquí fallaría las respuestas pendientes
+ADMISSION = AdmissionController(probe=client_queue_depth, rpc_in_flight=client_in_flight)
+
+def overloaded_response(rejection):
+    """Respuesta 429/503 con Retry-After para una solicitud no admitida"""
+    status, retry_after, message = rejection
+    if request.path == '/process' and request.headers.get('X-Requested-With') != 'XMLHttpRequest':
+        flash(message, 'warning')
+        response = make_response(index(), status)
+    else:
+        response = make_response(jsonify({'success': False, 'error': message}), status)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def _finish_admitted(rv):
+    """Liberar el hueco al terminar; en respuestas en streaming, al cerrar el flujo"""
+    try:
+        response = app.make_response(rv)
+    except Exception:
+        ADMISSION.release()
+        raise
+    if response.is_streamed:
+        response.call_on_close(ADMISSION.release)
+    else:
+        ADMISSION.release()
+    return response
+
+def admission_control(view):
+    """Aplicar el control de admisión a una ruta que hace RPC"""
+    if inspect.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            rejection = ADMISSION.acquire()
+            if rejection:
+                return overloaded_response(rejection)
+            try:
+                rv = await view(*args, **kwargs)
+            except Exception:
+                ADMISSION.release()
+                raise
+            return _finish_admitted(rv)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        rejection = ADMISSION.acquire()
+        if rejection:
+            return overloaded_response(rejection)
+        try:
+            rv = view(*args, **kwargs)
+        except Exception:
+            ADMISSION.release()
+            raise
+        return _finish_admitted(rv)
+    return wrapper
+
+def history_session_id():
+    """Id del historial de la sesión actual; la cookie solo guarda este id"""
+    if 'history_id' not in session:
+        session['history_id'] = uuid.uuid4().hex
+    return session['history_id']
+
 # Función para guardar historial
 def save_history(operation, input_text, result):
-    if 'history' not in session:
-        session['history'] = []
-    
-    history_item = {
-        'timestamp': datetime.datetime.now().strftime("%d/%m/%Y %H:%M:%S"),
-        'operation': operation,
-        'input_text': input_text,
-        'result': result
-    }
-    
-    session['history'] = [history_item] + session['history'][:19]
-    session.modified = True
+    HISTORY.add(history_session_id(), operation, input_text, result)
+
+def get_operation_name(operation):
+    """Obtener el nombre legible de una operación o tubería"""
+    if PIPELINE_SEPARATOR in operation:
+        return ' → '.join(get_operation_name(step) for step in operation.split(PIPELINE_SEPARATOR))
+    op = get_operation(operation)
+    return op.name if op else operation
 
 # Rutas de la aplicación
 @app.route('/')
@@ -41,10 +133,16 @@ def index():
     server_status = get_server_status()
     connected = client_status["connected"] and server_status["running"]
     
+    page = max(request.args.get('page', 1, type=int), 1)
+    history, history_total = HISTORY.page(session.get('history_id'), page, HISTORY_PAGE_SIZE)
+    
     return render_template('index.html', 
                           operations=TEXT_OPERATIONS, 
+                          pipeline_separator=PIPELINE_SEPARATOR,
                           connected=connected,
-                          history=session.get('history', []))
+                          history=history,
+                          history_page=page,
+                          history_pages=-(-history_total // HISTORY_PAGE_SIZE))
 
 @app.route('/about')
 def about():
@@ -52,9 +150,10 @@ def about():
     return render_template('about.html')
 
 @app.route('/process', methods=['POST'])
+@admission_control
 def process_text():
     """Procesar texto vía RPC"""
-    operation = request.form.get('operation')
+    operation = request.form.get('pipeline') or request.form.get('operation')
     text = request.form.get('text')
     
     if not operation or not text:
@@ -81,36 +180,22 @@ def process_text():
     payload = f"{operation}:{text}"
     
     # Enviar solicitud
-    corr_id = RPC_CLIENT.send_request(payload)
+    corr_id = RPC_CLIENT.send_request(payload, timeout=RPC_TIMEOUT)
     
     if not corr_id:
         flash('Error al enviar la solicitud', 'danger')
         return redirect(url_for('index'))
     
     # Esperar respuesta con timeout
-    max_wait = 100  # 10 segundos
-    counter = 0
-    
-    while counter < max_wait:
-        if corr_id in RPC_CLIENT.queue and RPC_CLIENT.queue[corr_id] is not None:
-            break
-        sleep(0.1)
-        counter += 1
+    result = RPC_CLIENT.wait_response(corr_id, timeout=RPC_TIMEOUT)
     
     # Verificar timeout
-    if counter >= max_wait or RPC_CLIENT.queue.get(corr_id) is None:
+    if result is None:
         flash('Tiempo de espera agotado. No se recibió respuesta del servidor', 'warning')
         return redirect(url_for('index'))
     
-    # Obtener resultado
-    result = RPC_CLIENT.queue[corr_id]
-    
     # Obtener nombre de operación
-    operation_name = operation
-    for op in TEXT_OPERATIONS:
-        if op['id'] == operation:
-            operation_name = op['name']
-            break
+    operation_name = get_operation_name(operation)
     
     # Guardar historial
     save_history(operation_name, text, result)
@@ -126,10 +211,219 @@ def process_text():
     flash(f'Operación completada: {operation_name}', 'success')
     return redirect(url_for('index'))
 
+@app.route('/process/batch', methods=['POST'])
+@admission_control
+def process_batch():
+    """Procesar un lote de operaciones en un único mensaje RPC"""
+    items = request.get_json(silent=True)
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'error': 'Se espera una lista JSON de {operation, text}'}), 400
+    
+    if len(items) > MAX_BATCH_ITEMS:
+        return jsonify({'success': False, 'error': f'El lote supera el máximo de {MAX_BATCH_ITEMS} elementos'}), 413
+    
+    for item in items:
+        if not isinstance(item, dict) or not item.get('operation') or not isinstance(item.get('text'), str):
+            return jsonify({'success': False, 'error': 'Cada elemento necesita operation y text'}), 400
+    
+    client = get_rpc_client()
+    if not client or not client.is_connected():
+        return jsonify({'success': False, 'error': 'No se pudo conectar con el servidor RPC'}), 503
+    
+    corr_id = client.send_batch(items, timeout=RPC_TIMEOUT)
+    if not corr_id:
+        return jsonify({'success': False, 'error': 'Error al enviar la solicitud'}), 502
+    
+    result = client.wait_response(corr_id, timeout=RPC_TIMEOUT)
+    if result is None:
+        return jsonify({'success': False, 'error': 'Tiempo de espera agotado'}), 504
+    
+    # Un lote que no llegó al servidor se completa con un texto de error en lugar de JSON
+    if result.startswith("ERROR:"):
+        return jsonify({'success': False, 'error': result[len("ERROR:"):].strip()}), 502
+    
+    return jsonify({
+        'success': True,
+        'results': json.loads(result)
+    })
+
+def chunked_body(mode, results):
+    """Cuerpo de una respuesta por fragmentos: las operaciones map se transmiten y las de conteo se suman
+
+    El primer fragmento se espera antes de responder para poder devolver los errores con su estado HTTP.
+    """
+    if mode == CHUNK_MAP:
+        first = next(results, '')
+        return stream_with_context(itertools.chain((first,), results))
+    return str(sum(int(result) for result in results))
+
+@app.route('/process/stream', methods=['POST'])
+@admission_control
+def process_stream():
+    """Procesar un texto grande por fragmentos; el cuerpo de la petición es el texto en UTF-8"""
+    operation = request.args.get('operation', '').lower()
+    mode = chunking_mode(operation)
+    
+    if mode is None:
+        return jsonify({'success': False, 'error': f"La operación '{operation}' no admite procesamiento por fragmentos"}), 400
+    
+    client = get_rpc_client()
+    if not client or not client.is_connected():
+        return jsonify({'success': False, 'error': 'No se pudo conectar con el servidor RPC'}), 503
+    
+    # Leer el cuerpo por fragmentos sin cargarlo completo en memoria
+    chunks = iter_chunks(request.stream.read, STREAM_CHUNK_SIZE)
+    results = client.stream_request(operation, chunks, timeout=RPC_TIMEOUT)
+    
+    try:
+        body = chunked_body(mode, results)
+    except TimeoutError:
+        return jsonify({'success': False, 'error': 'Tiempo de espera agotado'}), 504
+    except UnicodeDecodeError:
+        return jsonify({'success': False, 'error': 'El texto no es UTF-8 válido'}), 400
+    
+    return Response(body, mimetype='text/plain; charset=utf-8')
+
+@app.route('/process/file', methods=['POST'])
+@admission_control
+def process_file():
+    """Procesar un archivo subido (multipart, campo 'file') y devolver el resultado como descarga"""
+    operation = (request.form.get('pipeline') or request.form.get('operation') or '').lower()
+    mode = chunking_mode(operation)
+    upload = request.files.get('file')
+    
+    if not upload:
+        return jsonify({'success': False, 'error': 'Por favor, adjunta un archivo en el campo "file"'}), 400
+    if mode is None:
+        return jsonify({'success': False, 'error': f"La operación '{operation}' no admite procesamiento por fragmentos"}), 400
+    
+    client = get_rpc_client()
+    if not client or not client.is_connected():
+        return jsonify({'success': False, 'error': 'No se pudo conectar con el servidor RPC'}), 503
+    
+    # Werkzeug vuelca a un archivo temporal las subidas grandes; se lee por fragmentos, nunca completo
+    chunks = iter_chunks(upload.stream.read, STREAM_CHUNK_SIZE)
+    results = client.stream_request(operation, chunks, timeout=RPC_TIMEOUT)
+    
+    try:
+        body = chunked_body(mode, results)
+    except TimeoutError:
+        return jsonify({'success': False, 'error': 'Tiempo de espera agotado'}), 504
+    except UnicodeDecodeError:
+        return jsonify({'success': False, 'error': 'El archivo no es texto UTF-8 válido'}), 400
+    
+    name = secure_filename(upload.filename or '').rsplit('.', 1)[0] or 'texto'
+    download = f"{name}-{operation.replace(PIPELINE_SEPARATOR, '-')}.txt"
+    return Response(body, mimetype='text/plain; charset=utf-8',
+                    headers={'Content-Disposition': f'attachment; filename="{download}"'})
+
+@app.route('/process/async', methods=['POST'])
+@admission_control
+async def process_text_async():
+    """Procesar texto vía RPC sin bloquear el hilo mientras se espera la respuesta"""
+    operation = request.form.get('pipeline') or request.form.get('operation')
+    text = request.form.get('text')
+    
+    if not operation or not text:
+        return jsonify({'success': False, 'error': 'Por favor, completa todos los campos'}), 400
+    
+    # Obtener el cliente puede reconectar: fuera del bucle de eventos
+    client = await asyncio.to_thread(get_async_client)
+    if client is None or not client.client.is_connected():
+        return jsonify({'success': False, 'error': 'No se pudo conectar con el servidor RPC'}), 503
+    
+    result = await client.call(operation, text, timeout=RPC_TIMEOUT)
+    
+    if result is None:
+        return jsonify({'success': False, 'error': 'Tiempo de espera agotado'}), 504
+    
+    operation_name = get_operation_name(operation)
+    save_history(operation_name, text, result)
+    
+    return jsonify({
+        'success': True,
+        'operation': operation_name,
+        'result': result
+    })
+
+@app.route('/jobs', methods=['POST'])
+@admission_control
+def submit_job():
+    """Enviar una operación como trabajo asíncrono; devuelve el id sin esperar la respuesta"""
+    operation = request.form.get('pipeline') or request.form.get('operation')
+    text = request.form.get('text')
+    
+    if not operation or not text:
+        return jsonify({'success': False, 'error': 'Por favor, completa todos los campos'}), 400
+    
+    client = get_rpc_client()
+    if not client or not client.is_connected():
+        return jsonify({'success': False, 'error': 'No se pudo conectar con el servidor RPC'}), 503
+    
+    corr_id = client.send_request(f"{operation}:{text}", timeout=RPC_TIMEOUT)
+    if not corr_id:
+        return jsonify({'success': False, 'error': 'Error al enviar la solicitud'}), 502
+    
+    # El historial se guarda al terminar el trabajo, aunque nadie consulte el resultado
+    history_id = history_session_id()
+    job = JOBS.submit(client, corr_id, get_operation_name(operation), text, RPC_TIMEOUT,
+                      on_finish=lambda job: HISTORY.add(history_id, job.operation, job.text, job.result))
+    response = jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'poll_url': url_for('get_job', job_id=job.id),
+        'events_url': url_for('job_events', job_id=job.id)
+    })
+    response.status_code = 202
+    response.headers['Location'] = url_for('get_job', job_id=job.id)
+    return response
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """Estado de un trabajo; con ?wait=N espera hasta N segundos a que termine (long-poll)"""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Trabajo desconocido o caducado'}), 404
+    
+    wait = min(max(request.args.get('wait', 0, type=float), 0), JOB_POLL_WAIT)
+    if wait:
+        job.wait(wait)
+    
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Resultado de un trabajo como server-sent events"""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Trabajo desconocido o caducado'}), 404
+    
+    def events():
+        while True:
+            status = job.wait(SSE_KEEPALIVE)
+            if status == JOB_PENDING:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {status}\ndata: {json.dumps(job.to_dict())}\n\n"
+            return
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/history/text/<text_id>')
+def history_text(text_id):
+    """Texto completo de un elemento del historial"""
+    text = HISTORY.text(session.get('history_id'), text_id)
+    if text is None:
+        return jsonify({'success': False, 'error': 'El texto ya no está disponible en el historial'}), 404
+    return Response(text, mimetype='text/plain; charset=utf-8')
+
 @app.route('/clear-history', methods=['POST'])
 def clear_history():
     """Borrar historial"""
-    session.pop('history', None)
+    HISTORY.clear(session.get('history_id'))
     flash('Historial eliminado', 'info')
     return redirect(url_for('index'))
 
@@ -155,12 +449,29 @@ def status():
     return jsonify({
         'client': client_status,
         'server': server_status,
+        'admission': ADMISSION.stats(),
+        'jobs': JOBS.stats(),
+        'history': HISTORY.stats(),
         'rabbit': {
             'host': os.environ.get('CLOUDAMQP_URL', 'URL no disponible'),
             'queue': RPC_QUEUE
         }
     })
 
+@app.route('/metrics')
+def metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/traces')
+def debug_traces():
+    """Trazas muestreadas recientes con el desglose por etapa"""
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify({
+        'summary': TRACES.summary(),
+        'traces': TRACES.recent(limit)
+    })
+
 @app.route('/restart', methods=['POST'])
 def restart_services():
     """Reiniciar servicios"""
@@ -0,0 +1,187 @@
+import argparse
+import logging
+import random
+import string
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from broker_local import LocalAmqpBroker
+from cache import ResultCache
+import cliente
+from cliente import AmqpClientTransport, RpcClient, RPC_QUEUE
+from server import AmqpServerTransport, TextProcessingServer
+
+# Benchmark de extremo a extremo contra el broker en memoria
+#
+#   python benchmark.py --target client --concurrency 16 --requests 2000 --sizes 100,10000
+#   python benchmark.py --target http --operations mayusculas,titulo
+#   python benchmark.py --bulk-load 4 --bulk-lane interactive   (carga masiva compitiendo en la misma cola)
+#   python benchmark.py --direct-reply-to --broker-without-direct-reply-to   (respaldo con cola exclusiva)
+#
+# Mide el camino completo cliente -> broker -> servidor -> broker -> cliente sin red ni TLS,
+# para que las regresiones del camino crítico se vean en números.
+
+def percentile(values, fraction):
+    """Percentil por el método del rango más cercano sobre una lista ordenada"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))
+    return values[index]
+
+def random_text(size):
+    """Texto aleatorio con palabras de longitud variable"""
+    words = []
+    length = 0
+    while length < size:
+        word = ''.join(random.choices(string.ascii_letters, k=random.randint(1, 10)))
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)[:size]
+
+def start_services(broker, consumers, prefetch, cache_entries, confirm=False, direct_reply_to=False,
+                   bulk_consumers=1):
+    """Arrancar servidor y cliente RPC conectados al broker en memoria"""
+    server = TextProcessingServer(
+        None, None, None, RPC_QUEUE, None,
+        cache=ResultCache(cache_entries) if cache_entries else None,
+        transport=AmqpServerTransport(None, None, None, RPC_QUEUE, None, consumers=consumers,
+                                      prefetch=prefetch, connection_factory=broker.connection,
+                                      bulk_consumers=bulk_consumers)
+    )
+    thread = threading.Thread(target=server.start)
+    thread.daemon = True
+    thread.start()
+
+    client = RpcClient(
+        None, None, None, RPC_QUEUE, None,
+        transport=AmqpClientTransport(None, None, None, RPC_QUEUE, None, connection_factory=broker.connection,
+                                       confirm=confirm, direct_reply_to=direct_reply_to)
+    )
+
+    # Esperar a que los consumidores estén registrados
+    deadline = time.monotonic() + 5
+    while not cliente.CLIENT_STATUS["connected"] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.2)
+    return server, client
+
+def make_client_call(client, timeout):
+    """Llamada directa a RpcClient.send_request + wait_response"""
+    def call(operation, text):
+        corr_id = client.send_request(f"{operation}:{text}", timeout=timeout)
+        return corr_id is not None and client.wait_response(corr_id, timeout) is not None
+    return call
+
+def make_http_call(client):
+    """Llamada a /process a través del cliente de pruebas de Flask"""
+    import app as web
+    web.RPC_CLIENT = client
+    cliente.RPC_CLIENT = client
+    test_client = web.app.test_client()
+
+    def call(operation, text):
+        response = test_client.post('/process', data={'operation': operation, 'text': text},
+                                    headers={'X-Requested-With': 'XMLHttpRequest'})
+        return response.status_code == 200 and response.is_json
+    return call
+
+def start_bulk_load(client, senders, lane, size, timeout):
+    """Mantener solicitudes grandes en vuelo en segundo plano; devuelve el evento para detenerlas"""
+    stop = threading.Event()
+
+    def sender():
+        # Un texto propio por hilo para que las solicitudes no se unan en vuelo
+        text = random_text(size)
+        while not stop.is_set():
+            corr_id = client.send_request(f"titulo:{text}", timeout=timeout, lane=lane)
+            if corr_id is not None:
+                client.wait_response(corr_id, timeout)
+
+    for _ in range(senders):
+        thread = threading.Thread(target=sender)
+        thread.daemon = True
+        thread.start()
+    return stop
+
+def run(call, operations, sizes, requests, concurrency):
+    """Ejecutar las solicitudes y devolver latencias por (operación, tamaño)"""
+    jobs = [(operation, size) for operation in operations for size in sizes]
+    texts = {size: [random_text(size) for _ in range(16)] for size in sizes}
+    results = {job: {"latencies": [], "errors": 0} for job in jobs}
+    lock = threading.Lock()
+
+    def worker(job):
+        operation, size = job
+        text = random.choice(texts[size])
+        start = time.perf_counter()
+        ok = call(operation, text)
+        elapsed = time.perf_counter() - start
+        with lock:
+            if ok:
+                results[job]["latencies"].append(elapsed)
+            else:
+                results[job]["errors"] += 1
+
+    schedule = [jobs[i % len(jobs)] for i in range(requests)]
+    random.shuffle(schedule)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, schedule))
+    return results, time.perf_counter() - start
+
+def report(results, elapsed):
+    """Imprimir rendimiento y percentiles de latencia"""
+    total = sum(len(r["latencies"]) + r["errors"] for r in results.values())
+    print(f"{'operación':<20} {'tamaño':>8} {'n':>6} {'err':>5} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for (operation, size), result in sorted(results.items()):
+        latencies = sorted(result["latencies"])
+        count = len(latencies)
+        print(f"{operation:<20} {size:>8} {count:>6} {result['errors']:>5} {count / elapsed:>9.1f} "
+              f"{percentile(latencies, 0.50) * 1000:>8.2f} {percentile(latencies, 0.95) * 1000:>8.2f} "
+              f"{percentile(latencies, 0.99) * 1000:>8.2f}")
+    print(f"Total: {total} solicitudes en {elapsed:.2f} s ({total / elapsed:.1f} req/s)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de RpcClient y /process contra un broker en memoria")
+    parser.add_argument('--target', choices=['client', 'http'], default='client')
+    parser.add_argument('--operations', default='mayusculas,titulo,contar_palabras')
+    parser.add_argument('--sizes', default='100,10000')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--consumers', type=int, default=4)
+    parser.add_argument('--prefetch', type=int, default=1)
+    parser.add_argument('--cache', type=int, default=0, help="Entradas de la caché del servidor (0 = sin caché)")
+    parser.add_argument('--confirm', action='store_true', help="Publicar con confirmaciones del broker")
+    parser.add_argument('--direct-reply-to', action='store_true', help="Recibir respuestas por amq.rabbitmq.reply-to")
+    parser.add_argument('--broker-without-direct-reply-to', action='store_true',
+                        help="Simular un broker sin amq.rabbitmq.reply-to (prueba la cola exclusiva de respaldo)")
+    parser.add_argument('--bulk-consumers', type=int, default=1, help="Consumidores del carril masivo")
+    parser.add_argument('--bulk-load', type=int, default=0, help="Hilos enviando texto grande en segundo plano")
+    parser.add_argument('--bulk-lane', choices=['interactive', 'bulk'], default='bulk',
+                        help="Carril de la carga de fondo")
+    parser.add_argument('--bulk-size', type=int, default=1024 * 1024, help="Caracteres de cada solicitud de fondo")
+    parser.add_argument('--timeout', type=float, default=10)
+    parser.add_argument('--log-level', default='WARNING', help="Nivel de logging durante la medición")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(args.log_level)
+
+    broker = LocalAmqpBroker(direct_reply_to=not args.broker_without_direct_reply_to)
+    server, client = start_services(broker, args.consumers, args.prefetch, args.cache, args.confirm,
+                                    args.direct_reply_to, args.bulk_consumers)
+    print(f"Modo de respuestas: {client.transport.reply_mode}")
+    call = make_client_call(client, args.timeout) if args.target == 'client' else make_http_call(client)
+    bulk = start_bulk_load(client, args.bulk_load, args.bulk_lane, args.bulk_size, args.timeout)
+
+    try:
+        results, elapsed = run(call, args.operations.split(','), [int(s) for s in args.sizes.split(',')],
+                               args.requests, args.concurrency)
+        report(results, elapsed)
+    finally:
+        bulk.set()
+        client.close()
+        server.stop()
+
+if __name__ == "__main__":
+    main()
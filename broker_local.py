@@ -0,0 +1,294 @@
+import threading
+import itertools
+import time
+import uuid
+from collections import deque
+from amqpstorm import Message
+from amqpstorm.exception import AMQPChannelError, AMQPConnectionError
+
+# Broker AMQP en memoria para pruebas y benchmarks
+#
+# Implementa el subconjunto de amqpstorm que usan cliente y servidor: declaración de colas
+# (incluidas las exclusivas con nombre generado), qos, publish en el exchange por defecto,
+# consume, start_consuming y ack/nack. Los mensajes se entregan como amqpstorm.Message reales.
+# También admite la pseudo-cola amq.rabbitmq.reply-to de RabbitMQ (direct reply-to), que puede
+# desactivarse para probar el modo de respaldo con cola exclusiva. Los mensajes con 'expiration'
+# vencidos se descartan al llegar a la cabeza de la cola, como en RabbitMQ.
+
+DIRECT_REPLY_QUEUE = 'amq.rabbitmq.reply-to'
+
+class _LocalQueue(object):
+    """Cola con sus mensajes y consumidores"""
+    def __init__(self, name, exclusive_owner=None, arguments=None):
+        self.name = name
+        self.exclusive_owner = exclusive_owner
+        self.arguments = arguments or {}
+        self.messages = deque()
+        self.consumers = []
+        self._next_consumer = 0
+
+class _LocalConsumer(object):
+    """Consumidor registrado en una cola"""
+    def __init__(self, channel, tag, callback, no_ack):
+        self.channel = channel
+        self.tag = tag
+        self.callback = callback
+        self.no_ack = no_ack
+
+class LocalAmqpBroker(object):
+    """Broker en memoria; connection() sustituye a amqpstorm.Connection"""
+    def __init__(self, direct_reply_to=True):
+        self.queues = {}
+        self.lock = threading.RLock()
+        self.published = 0
+        self.expired = 0
+        self.direct_reply_to = direct_reply_to
+
+    def connection(self, *args, **kwargs):
+        """Fábrica compatible con la firma de amqpstorm.Connection"""
+        return LocalConnection(self)
+
+    def declare(self, channel, name, passive, exclusive, arguments):
+        with self.lock:
+            if not name:
+                name = f"amq.gen-{uuid.uuid4()}"
+            local_queue = self.queues.get(name)
+            if local_queue is None:
+                if passive:
+                    raise AMQPChannelError(f"NOT_FOUND - no queue '{name}'")
+                owner = channel.connection if exclusive else None
+                local_queue = self.queues[name] = _LocalQueue(name, owner, arguments)
+            elif local_queue.exclusive_owner is not None and local_queue.exclusive_owner is not channel.connection:
+                raise AMQPChannelError(f"RESOURCE_LOCKED - queue '{name}' is exclusive")
+            return {
+                'queue': name,
+                'message_count': len(local_queue.messages),
+                'consumer_count': len(local_queue.consumers)
+            }
+
+    def publish(self, channel, body, routing_key, properties):
+        with self.lock:
+            # Direct reply-to: el broker sustituye la pseudo-cola por la del canal que publica
+            if properties.get('reply_to') == DIRECT_REPLY_QUEUE:
+                if channel.direct_reply_queue is None:
+                    raise AMQPChannelError("PRECONDITION_FAILED - fast reply consumer does not exist")
+                properties['reply_to'] = channel.direct_reply_queue
+            self.published += 1
+            local_queue = self.queues.get(routing_key)
+            # El exchange por defecto descarta mensajes sin cola destino
+            if local_queue is None:
+                return
+            expiration = properties.get('expiration')
+            expires_at = time.monotonic() + int(expiration) / 1000 if expiration else None
+            local_queue.messages.append((body, properties, expires_at))
+            self.dispatch(local_queue)
+
+    def consume(self, channel, queue_name, callback, consumer_tag, no_ack):
+        with self.lock:
+            if queue_name == DIRECT_REPLY_QUEUE:
+                queue_name = self._direct_reply_queue(channel, no_ack)
+            local_queue = self.queues.get(queue_name)
+            if local_queue is None:
+                raise AMQPChannelError(f"NOT_FOUND - no queue '{queue_name}'")
+            tag = consumer_tag or f"ctag-{uuid.uuid4()}"
+            local_queue.consumers.append(_LocalConsumer(channel, tag, callback, no_ack))
+            self.dispatch(local_queue)
+            return tag
+
+    def _direct_reply_queue(self, channel, no_ack):
+        """Crear la cola de respuestas directas de un canal (requiere el lock)"""
+        if not self.direct_reply_to:
+            channel.close()
+            raise AMQPChannelError(f"NOT_FOUND - no queue '{DIRECT_REPLY_QUEUE}'")
+        if not no_ack:
+            channel.close()
+            raise AMQPChannelError("PRECONDITION_FAILED - reply consumer cannot acknowledge")
+        name = f"{DIRECT_REPLY_QUEUE}.{uuid.uuid4()}"
+        self.queues[name] = _LocalQueue(name, channel.connection)
+        channel.direct_reply_queue = name
+        return name
+
+    def dispatch(self, local_queue):
+        """Repartir mensajes en round-robin respetando el prefetch de cada canal (requiere el lock)"""
+        while local_queue.messages and local_queue.consumers:
+            consumer = None
+            for _ in range(len(local_queue.consumers)):
+                candidate = local_queue.consumers[local_queue._next_consumer % len(local_queue.consumers)]
+                local_queue._next_consumer += 1
+                if candidate.channel.has_capacity():
+                    consumer = candidate
+                    break
+            if consumer is None:
+                return
+            body, properties, expires_at = local_queue.messages.popleft()
+            if expires_at is not None and expires_at < time.monotonic():
+                self.expired += 1
+                continue
+            consumer.channel.deliver(consumer, local_queue, body, properties, expires_at)
+
+    def requeue(self, local_queue, body, properties, expires_at=None):
+        with self.lock:
+            local_queue.messages.appendleft((body, properties, expires_at))
+            self.dispatch(local_queue)
+
+    def remove_channel(self, channel):
+        """Quitar los consumidores y la cola de respuestas directas de un canal cerrado"""
+        with self.lock:
+            if channel.direct_reply_queue is not None:
+                self.queues.pop(channel.direct_reply_queue, None)
+            for local_queue in self.queues.values():
+                local_queue.consumers = [c for c in local_queue.consumers if c.channel is not channel]
+
+    def remove_connection(self, connection):
+        """Eliminar las colas exclusivas de una conexión cerrada"""
+        with self.lock:
+            for name in [n for n, q in self.queues.items() if q.exclusive_owner is connection]:
+                del self.queues[name]
+
+    def queue_depth(self, name):
+        """Mensajes pendientes en una cola"""
+        with self.lock:
+            local_queue = self.queues.get(name)
+            return len(local_queue.messages) if local_queue else 0
+
+class LocalConnection(object):
+    """Conexión en memoria con la interfaz de amqpstorm.Connection usada por los transportes"""
+    def __init__(self, broker):
+        self.broker = broker
+        self.channels = []
+        self._open = True
+
+    @property
+    def is_open(self):
+        return self._open
+
+    def channel(self):
+        if not self._open:
+            raise AMQPConnectionError("Connection was closed")
+        channel = LocalChannel(self)
+        self.channels.append(channel)
+        return channel
+
+    def close(self):
+        if not self._open:
+            return
+        self._open = False
+        for channel in self.channels:
+            channel.close()
+        self.broker.remove_connection(self)
+
+class LocalChannel(object):
+    """Canal en memoria: cola de entregas propia consumida por start_consuming"""
+    def __init__(self, connection):
+        self.connection = connection
+        self.broker = connection.broker
+        self.queue = _QueueOperations(self)
+        self.basic = _BasicOperations(self)
+        self.prefetch_count = 0
+        self.confirming_deliveries = False
+        self.direct_reply_queue = None
+        self.unacked = {}
+        self._tags = itertools.count(1)
+        self._inbound = deque()
+        self._cond = threading.Condition()
+        self._open = True
+
+    @property
+    def is_open(self):
+        return self._open and self.connection.is_open
+
+    def has_capacity(self):
+        return self.prefetch_count == 0 or len(self.unacked) < self.prefetch_count
+
+    def deliver(self, consumer, local_queue, body, properties, expires_at=None):
+        """Entregar un mensaje a este canal (llamado con el lock del broker)"""
+        tag = next(self._tags)
+        if not consumer.no_ack:
+            self.unacked[tag] = (local_queue, body, properties, expires_at)
+        message = Message(self, body=body, method={
+            'delivery_tag': tag,
+            'consumer_tag': consumer.tag,
+            'routing_key': local_queue.name,
+            'exchange': '',
+            'redelivered': False
+        }, properties=dict(properties))
+        with self._cond:
+            self._inbound.append((consumer.callback, message))
+            self._cond.notify()
+
+    def confirm_deliveries(self):
+        self.confirming_deliveries = True
+
+    def start_consuming(self, to_tuple=False, auto_decode=True):
+        """Procesar entregas hasta que se cierre el canal"""
+        while self.is_open:
+            with self._cond:
+                while self.is_open and not self._inbound:
+                    self._cond.wait(0.5)
+                if not self._inbound:
+                    break
+                callback, message = self._inbound.popleft()
+            callback(message)
+        if not self.connection.is_open:
+            raise AMQPConnectionError("Connection was closed")
+
+    def close(self):
+        if not self._open:
+            return
+        self._open = False
+        self.broker.remove_channel(self)
+        # Los mensajes sin confirmar vuelven a su cola
+        for local_queue, body, properties, expires_at in list(self.unacked.values()):
+            self.broker.requeue(local_queue, body, properties, expires_at)
+        self.unacked.clear()
+        with self._cond:
+            self._cond.notify_all()
+
+class _QueueOperations(object):
+    def __init__(self, channel):
+        self._channel = channel
+
+    def declare(self, queue='', passive=False, durable=False, exclusive=False, auto_delete=False, arguments=None):
+        return self._channel.broker.declare(self._channel, queue, passive, exclusive, arguments)
+
+class _BasicOperations(object):
+    def __init__(self, channel):
+        self._channel = channel
+
+    def qos(self, prefetch_count=0, prefetch_size=0, global_=False):
+        self._channel.prefetch_count = prefetch_count
+        return {}
+
+    def consume(self, callback=None, queue='', consumer_tag='', exclusive=False, no_ack=False,
+                no_local=False, arguments=None):
+        return self._channel.broker.consume(self._channel, queue, callback, consumer_tag, no_ack)
+
+    def publish(self, body, routing_key, exchange='', properties=None, mandatory=False, immediate=False):
+        if not self._channel.is_open:
+            raise AMQPChannelError("Channel was closed")
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self._channel.broker.publish(self._channel, body, routing_key, dict(properties or {}))
+        if self._channel.confirming_deliveries:
+            return True
+
+    def ack(self, delivery_tag=0, multiple=False):
+        self._settle(delivery_tag, multiple)
+
+    def nack(self, delivery_tag=0, multiple=False, requeue=True):
+        for local_queue, body, properties, expires_at in self._settle(delivery_tag, multiple):
+            if requeue:
+                self._channel.broker.requeue(local_queue, body, properties, expires_at)
+
+    def reject(self, delivery_tag=0, requeue=True):
+        self.nack(delivery_tag, False, requeue)
+
+    def _settle(self, delivery_tag, multiple):
+        """Retirar mensajes sin confirmar y liberar capacidad de prefetch"""
+        channel = self._channel
+        with channel.broker.lock:
+            tags = [t for t in channel.unacked if t <= delivery_tag] if multiple else [delivery_tag]
+            settled = [channel.unacked.pop(t) for t in tags if t in channel.unacked]
+            for local_queue in {entry[0] for entry in settled}:
+                channel.broker.dispatch(local_queue)
+        return settled
@@ -0,0 +1,81 @@
+import threading
+import hashlib
+import sys
+from collections import OrderedDict
+
+# Límites por defecto de la caché de resultados
+CACHE_MAX_ENTRIES = 1024
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+def cache_key(*parts):
+    """Clave compacta para un payload 'comando:texto', entero o en partes"""
+    digest = hashlib.blake2b(digest_size=16)
+    for index, part in enumerate(parts):
+        if index:
+            digest.update(b':')
+        digest.update(part.encode('utf-8', 'surrogatepass'))
+    return digest.digest()
+
+# Caché LRU de resultados de operaciones deterministas
+class ResultCache(object):
+    """Caché LRU limitada por número de entradas y por bytes totales"""
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # Un resultado no puede ocupar más de una fracción de la caché
+        self.max_item_bytes = max_bytes // 8
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Obtener un resultado y marcarlo como usado recientemente"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, result):
+        """Guardar un resultado, expulsando los menos usados si hace falta"""
+        size = sys.getsizeof(result)
+        if size > self.max_item_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+
+            self._entries[key] = (result, size)
+            self.bytes += size
+
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        """Vaciar la caché"""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Estadísticas de la caché"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
@@ -1,12 +1,26 @@
 import threading
+import queue
 import time
+import asyncio
 import os
 import datetime
 import json
+from collections import OrderedDict
+from contextlib import contextmanager
 from urllib.parse import urlparse
 import amqpstorm
 from amqpstorm import Message
+from amqpstorm.exception import AMQPChannelError
 import logging
+import uuid
+from cache import ResultCache, cache_key
+from transporte import TRANSPORT_AMQP, TRANSPORT_LOCAL, InProcessClientTransport
+from protocolo import (BATCH_MESSAGE_TYPE, FRAME_CONTENT_TYPE, FRAME_VERSION, FRAME_VERSION_HEADER, LANE_BULK,
+                       LANE_INTERACTIVE, LANES, STATUS_OK, STREAM_INDEX_HEADER, STREAM_MESSAGE_TYPE, apply_deadline,
+                       decode_frame, encode_frame, lane_queue)
+from operaciones import operation_label
+from metricas import counter, gauge, histogram
+from trazas import TRACE_CLIENT_SEND, TRACES, build_trace, now_us, should_sample
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, 
@@ -26,6 +40,23 @@ RABBIT_PORT = 5671  # Puerto para TLS
 RABBIT_SSL = True   # Habilitar SSL para conexión segura
 RPC_QUEUE = 'rpc_queue'
 HEARTBEAT_INTERVAL = 30  # Reducir el intervalo de heartbeat a 30 segundos
+RPC_TRANSPORT = os.environ.get('RPC_TRANSPORT', TRANSPORT_AMQP)  # 'amqp' o 'local' (cliente y servidor en el mismo proceso)
+STREAM_WINDOW = int(os.environ.get('STREAM_WINDOW', 8))  # Fragmentos en vuelo por flujo
+CLIENT_CACHE_ENTRIES = int(os.environ.get('CLIENT_CACHE_ENTRIES', 0))  # Entradas de la caché local del cliente (0 = desactivada)
+CLIENT_CACHE_BYTES = int(os.environ.get('CLIENT_CACHE_BYTES', 16 * 1024 * 1024))  # Bytes máximos de la caché local del cliente
+FRAMED_PROTOCOL = os.environ.get('FRAMED_PROTOCOL', '1') == '1'  # Usar el protocolo binario si el servidor lo anuncia
+PENDING_MAX_SIZE = int(os.environ.get('PENDING_MAX_SIZE', 10000))  # Máximo de respuestas pendientes
+PENDING_TTL = float(os.environ.get('PENDING_TTL', 30))  # Segundos antes de descartar una respuesta pendiente
+CHANNEL_POOL_SIZE = int(os.environ.get('CHANNEL_POOL_SIZE', 8))  # Canales de publicación compartidos por los hilos
+CHANNEL_CHECKOUT_TIMEOUT = float(os.environ.get('CHANNEL_CHECKOUT_TIMEOUT', 5))  # Segundos de espera por un canal libre
+DIRECT_REPLY_TO = os.environ.get('DIRECT_REPLY_TO', '0') == '1'  # Recibir respuestas por amq.rabbitmq.reply-to
+DIRECT_REPLY_QUEUE = 'amq.rabbitmq.reply-to'  # Pseudo-cola de RabbitMQ para respuestas directas
+COALESCE_REQUESTS = os.environ.get('COALESCE_REQUESTS', '1') == '1'  # Unir solicitudes idénticas en vuelo en una sola
+CONFIRM_PUBLISH = os.environ.get('CONFIRM_PUBLISH', '0') == '1'  # Publicar con confirmaciones del broker
+CONFIRM_CHANNELS = int(os.environ.get('CONFIRM_CHANNELS', 4))  # Canales en modo confirm publicando en paralelo
+CONFIRM_BATCH = int(os.environ.get('CONFIRM_BATCH', 64))  # Mensajes que toma cada publicador de la cola por vuelta
+CONFIRM_RETRIES = int(os.environ.get('CONFIRM_RETRIES', 3))  # Reenvíos tras un nack o un error antes de rendirse
+BULK_THRESHOLD = int(os.environ.get('BULK_THRESHOLD', 256 * 1024))  # Caracteres a partir de los cuales una solicitud va al carril masivo
 
 # Estado global
 CLIENT_STATUS = {
@@ -36,10 +67,539 @@ CLIENT_STATUS = {
     "last_reconnect": None
 }
 
-# Clase de Cliente RPC mejorada
-class RpcClient(object):
-    def __init__(self, host, username, password, rpc_queue, vhost, port=5671, ssl=True, heartbeat=30):
-        self.queue = {}
+# Métricas del cliente
+CLIENT_REQUESTS = counter('textpro_client_requests_total', "Solicitudes RPC publicadas", ('operation',))
+CLIENT_REPLIES = counter('textpro_client_replies_total', "Respuestas RPC entregadas a tiempo")
+CLIENT_ERRORS = counter('textpro_client_errors_total', "Errores del cliente RPC")
+CLIENT_IN_FLIGHT = gauge('textpro_client_in_flight', "Solicitudes RPC publicadas que esperan respuesta")
+PENDING_SIZE = gauge('textpro_client_pending_replies', "Entradas en la tabla de respuestas pendientes")
+PENDING_EVICTIONS = counter('textpro_client_pending_evictions_total', "Respuestas pendientes descartadas por TTL o tamaño")
+LATE_REPLIES = counter('textpro_client_late_replies_total', "Respuestas recibidas tarde o desconocidas")
+ROUND_TRIP = histogram('textpro_client_round_trip_seconds', "Tiempo desde la publicación hasta la llegada de la respuesta",
+                       ('operation',))
+LANE_REQUESTS = counter('textpro_client_lane_requests_total', "Mensajes publicados por carril de prioridad", ('lane',))
+COALESCED = counter('textpro_client_coalesced_total', "Solicitudes resueltas con la respuesta de otra idéntica en vuelo")
+PUBLISH_CONFIRMS = counter('textpro_client_publish_confirms_total', "Resultados de publicaciones confirmadas",
+                           ('result',))
+CHANNELS_IN_USE = gauge('textpro_client_channels_in_use', "Canales de publicación prestados")
+CHANNEL_WAIT = histogram('textpro_client_channel_wait_seconds', "Espera para obtener un canal de publicación")
+REPLY_WAIT = histogram('textpro_client_reply_wait_seconds', "Tiempo bloqueado esperando una respuesta", ('operation',))
+
+def _record_error(message):
+    """Contar un error del cliente y recordar el último"""
+    CLIENT_ERRORS.inc()
+    CLIENT_STATUS["last_error"] = message
+
+# Respuesta pendiente asociada a un correlation_id
+class PendingReply(object):
+    """Manejador de espera para una respuesta RPC"""
+    __slots__ = ('corr_id', 'deadline', 'cache_key', 'flight_key', 'operation', 'sent_at', 'settled', 'trace', 'body',
+                 '_event', '_callbacks', '_lock')
+
+    def __init__(self, corr_id, deadline, cache_key=None, operation="otra"):
+        self.corr_id = corr_id
+        self.deadline = deadline
+        self.cache_key = cache_key
+        # Clave de la solicitud en vuelo a la que pueden unirse otras idénticas
+        self.flight_key = None
+        self.operation = operation
+        self.sent_at = time.monotonic()
+        # Deja de contar como en vuelo al completarse, expirar o retirarse
+        self.settled = False
+        # Cabeceras de traza y marca de llegada, si la solicitud fue muestreada
+        self.trace = None
+        self.body = None
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def set_result(self, body):
+        """Completar la respuesta y despertar a quien espera"""
+        with self._lock:
+            self.body = body
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            # Un callback que falla no debe impedir que se ejecuten los demás
+            try:
+                callback(self)
+            except Exception as e:
+                logger.error(f"Error en callback de respuesta {self.corr_id}: {str(e)}")
+
+    def add_done_callback(self, callback):
+        """Ejecutar callback(pending) cuando llegue la respuesta"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def done(self):
+        """Indicar si ya llegó la respuesta"""
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        """Esperar la respuesta hasta el timeout; devuelve None si no llega"""
+        if self._event.wait(timeout):
+            return self.body
+        return None
+
+# Respuestas pendientes de un flujo de fragmentos
+class PendingStream(object):
+    """Manejador de espera que entrega en orden las respuestas de cada fragmento"""
+    __slots__ = ('corr_id', 'deadline', 'ttl', 'settled', '_chunks', '_next', '_cond')
+
+    def __init__(self, corr_id, ttl):
+        self.corr_id = corr_id
+        self.ttl = ttl
+        self.settled = False
+        self.deadline = time.monotonic() + ttl
+        self._chunks = {}
+        self._next = 0
+        self._cond = threading.Condition()
+
+    def put(self, index, body):
+        """Guardar la respuesta de un fragmento; cada llegada renueva el plazo"""
+        with self._cond:
+            self._chunks[index] = body
+            self.deadline = time.monotonic() + self.ttl
+            self._cond.notify_all()
+
+    def next(self, timeout=None):
+        """Esperar la siguiente respuesta en orden; devuelve None si no llega"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._next in self._chunks, timeout):
+                return None
+            body = self._chunks.pop(self._next)
+            self._next += 1
+            return body
+
+# Tabla acotada de respuestas pendientes con expiración
+class PendingReplyTable(object):
+    """Respuestas pendientes indexadas por correlation_id, con TTL y tamaño máximo"""
+    def __init__(self, max_size=PENDING_MAX_SIZE, ttl=PENDING_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.evictions = 0
+        self.late_replies = 0
+
+    def add(self, corr_id, timeout=None, cache_key=None, operation="otra"):
+        """Registrar una respuesta pendiente y devolver su manejador"""
+        pending = PendingReply(corr_id, time.monotonic() + (timeout or self.ttl), cache_key, operation)
+        self._insert(pending)
+        return pending
+
+    def add_result(self, corr_id, body, timeout=None, operation="otra"):
+        """Registrar una respuesta ya disponible (p. ej. un acierto de caché), que no cuenta como en vuelo"""
+        pending = PendingReply(corr_id, time.monotonic() + (timeout or self.ttl), operation=operation)
+        pending.settled = True
+        pending.set_result(body)
+        self._insert(pending)
+        return pending
+
+    def add_follower(self, corr_id, leader, timeout=None):
+        """Registrar una espera que se resuelve con la respuesta de otra solicitud en vuelo"""
+        pending = PendingReply(corr_id, time.monotonic() + (timeout or self.ttl), operation=leader.operation)
+        pending.settled = True
+        self._insert(pending)
+        leader.add_done_callback(lambda p: pending.set_result(p.body))
+        return pending
+
+    def add_stream(self, corr_id, timeout=None):
+        """Registrar un flujo de fragmentos y devolver su manejador"""
+        pending = PendingStream(corr_id, timeout or self.ttl)
+        self._insert(pending)
+        return pending
+
+    def _insert(self, pending):
+        """Insertar una entrada respetando el tamaño máximo"""
+        with self._lock:
+            self._evict_expired(time.monotonic())
+            while len(self._entries) >= self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self._discard(evicted)
+            self._entries[pending.corr_id] = pending
+            PENDING_SIZE.inc()
+            if not pending.settled:
+                self._in_flight += 1
+                CLIENT_IN_FLIGHT.inc()
+
+    def _settle(self, pending):
+        """Dejar de contar una entrada como en vuelo (requiere el lock)"""
+        if not pending.settled:
+            pending.settled = True
+            self._in_flight -= 1
+            CLIENT_IN_FLIGHT.dec()
+
+    def _discard(self, pending):
+        """Contabilizar una entrada expulsada antes de tiempo (requiere el lock)"""
+        self.evictions += 1
+        PENDING_EVICTIONS.inc()
+        PENDING_SIZE.dec()
+        self._settle(pending)
+
+    def get(self, corr_id):
+        """Obtener el manejador de una respuesta pendiente"""
+        with self._lock:
+            return self._entries.get(corr_id)
+
+    def complete(self, corr_id, body, trace=None):
+        """Entregar una respuesta; devuelve None si llegó tarde o es desconocida"""
+        now = time.monotonic()
+        with self._lock:
+            pending = self._entries.get(corr_id)
+            if pending is None or pending.deadline < now:
+                self.late_replies += 1
+                LATE_REPLIES.inc()
+                return None
+            self._settle(pending)
+        ROUND_TRIP.labels(pending.operation).observe(now - pending.sent_at)
+        CLIENT_REPLIES.inc()
+        pending.trace = trace
+        pending.set_result(body)
+        return pending
+
+    def deliver_chunk(self, corr_id, index, body):
+        """Entregar la respuesta de un fragmento; devuelve False si el flujo ya no existe"""
+        with self._lock:
+            pending = self._entries.get(corr_id)
+            if not isinstance(pending, PendingStream) or pending.deadline < time.monotonic():
+                self.late_replies += 1
+                LATE_REPLIES.inc()
+                return False
+            # Mantener el orden de expiración: el flujo sigue vivo
+            self._entries.move_to_end(corr_id)
+        pending.put(index, body)
+        return True
+
+    def pop(self, corr_id):
+        """Eliminar una respuesta pendiente, completada o no"""
+        with self._lock:
+            pending = self._entries.pop(corr_id, None)
+            if pending is not None:
+                PENDING_SIZE.dec()
+                self._settle(pending)
+            return pending
+
+    def clear(self, body):
+        """Retirar todas las entradas, completando con body las respuestas que aún se esperan"""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+            for pending in entries:
+                PENDING_SIZE.dec()
+                self._settle(pending)
+        for pending in entries:
+            if isinstance(pending, PendingReply) and not pending.done():
+                pending.set_result(body)
+
+    def _evict_expired(self, now):
+        """Eliminar entradas vencidas desde la más antigua (requiere el lock)"""
+        while self._entries:
+            corr_id, pending = next(iter(self._entries.items()))
+            if pending.deadline >= now:
+                break
+            del self._entries[corr_id]
+            self._discard(pending)
+
+    def in_flight(self):
+        """Solicitudes de esta tabla que aún esperan respuesta y no han vencido"""
+        with self._lock:
+            self._evict_expired(time.monotonic())
+            return self._in_flight
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Estadísticas de la tabla"""
+        with self._lock:
+            self._evict_expired(time.monotonic())
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "evictions": self.evictions,
+                "late_replies": self.late_replies
+            }
+
+def record_trace(pending):
+    """Guardar la traza de una respuesta muestreada al despertar a quien la espera"""
+    if pending.trace is None:
+        return
+    headers, received = pending.trace
+    trace = build_trace(pending.corr_id, pending.operation, headers, received, now_us())
+    if trace is not None:
+        TRACES.add(trace)
+
+# Pool de canales de publicación
+class ChannelPool(object):
+    """Canales AMQP prestados de uno en uno: ningún canal se usa desde dos hilos a la vez"""
+    def __init__(self, open_channel, size=CHANNEL_POOL_SIZE, timeout=CHANNEL_CHECKOUT_TIMEOUT):
+        self.open_channel = open_channel
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._idle = []
+        self._created = 0
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        # Integral de canales prestados en el tiempo, para la utilización media
+        self._busy_time = 0.0
+        self._started = self._changed = time.monotonic()
+
+    @contextmanager
+    def channel(self, timeout=None):
+        """Prestar un canal; si falla la operación el canal se descarta"""
+        channel = self.checkout(timeout)
+        try:
+            yield channel
+        except Exception:
+            self.discard(channel)
+            raise
+        self.checkin(channel)
+
+    def checkout(self, timeout=None):
+        """Obtener un canal abierto, creando uno si hay sitio o esperando a que se devuelva"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        waited = False
+        with self._cond:
+            while True:
+                while self._idle:
+                    channel = self._idle.pop()
+                    if channel.is_open:
+                        self._lend(started, waited)
+                        return channel
+                    self._created -= 1
+                if self._created < self.size:
+                    self._created += 1
+                    self._lend(started, waited)
+                    break
+                waited = True
+                remaining = started + timeout - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    raise TimeoutError("No hay canales de publicación libres")
+        
+        # Abrir el canal nuevo fuera del lock
+        try:
+            return self.open_channel()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._release()
+            raise
+
+    def checkin(self, channel):
+        """Devolver un canal al pool"""
+        with self._cond:
+            self._idle.append(channel)
+            self._release()
+
+    def discard(self, channel):
+        """Cerrar y olvidar un canal que falló"""
+        with self._cond:
+            self._created -= 1
+            self._release()
+        try:
+            channel.close()
+        except Exception:
+            pass
+
+    def reset(self):
+        """Olvidar los canales libres (p. ej. tras reconectar)"""
+        with self._cond:
+            self._created -= len(self._idle)
+            self._idle = []
+            self._cond.notify_all()
+
+    def _lend(self, started, waited):
+        """Contabilizar un préstamo (requiere el lock)"""
+        self._account()
+        self._in_use += 1
+        self.checkouts += 1
+        CHANNELS_IN_USE.inc()
+        elapsed = time.monotonic() - started
+        CHANNEL_WAIT.observe(elapsed)
+        if waited:
+            self.waits += 1
+            self.wait_time += elapsed
+            self.max_wait = max(self.max_wait, elapsed)
+
+    def _release(self):
+        """Contabilizar una devolución y despertar a quien espera (requiere el lock)"""
+        self._account()
+        self._in_use -= 1
+        CHANNELS_IN_USE.dec()
+        self._cond.notify()
+
+    def _account(self):
+        now = time.monotonic()
+        self._busy_time += self._in_use * (now - self._changed)
+        self._changed = now
+
+    def stats(self):
+        """Tamaño, espera y utilización del pool"""
+        with self._cond:
+            self._account()
+            elapsed = max(self._changed - self._started, 1e-9)
+            return {
+                "size": self.size,
+                "created": self._created,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "wait_time_total": self.wait_time,
+                "max_wait": self.max_wait,
+                "utilization": self._busy_time / (elapsed * self.size)
+            }
+
+# Mensaje a la espera de confirmación del broker
+class OutgoingMessage(object):
+    """Solicitud encolada para publicar, con su número de intentos"""
+    __slots__ = ('body', 'properties', 'routing_key', 'attempts')
+
+    def __init__(self, body, properties, routing_key):
+        self.body = body
+        self.properties = properties
+        self.routing_key = routing_key
+        self.attempts = 0
+
+# Publicación con confirmaciones del broker
+class ConfirmedPublisher(object):
+    """Los llamadores encolan sin esperar; varios canales en modo confirm publican en paralelo y reenvían los nack"""
+    def __init__(self, open_channel, channels=CONFIRM_CHANNELS, batch=CONFIRM_BATCH, max_retries=CONFIRM_RETRIES,
+                 on_failure=None, reply_to=None):
+        self.open_channel = open_channel
+        # La cola de respuestas cambia al reconectar; se consulta en cada intento
+        self.reply_to = reply_to
+        self.channels = max(1, channels)
+        self.batch = max(1, batch)
+        self.max_retries = max_retries
+        self.on_failure = on_failure
+        self._queue = queue.Queue()
+        # Mensajes sacados de la cola por los publicadores y aún sin confirmar, rechazar ni devolver a la cola
+        self.outstanding = 0
+        self._lock = threading.Lock()
+        self._threads = []
+        self.running = False
+        self.confirmed = 0
+        self.nacked = 0
+        self.resent = 0
+        self.failed = 0
+
+    def start(self):
+        """Arrancar los hilos publicadores"""
+        if self.running:
+            return
+        self.running = True
+        self._threads = []
+        for index in range(self.channels):
+            thread = threading.Thread(target=self._run, args=(index,))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def publish(self, body, properties, routing_key):
+        """Encolar un mensaje; la confirmación se gestiona en segundo plano"""
+        self._queue.put(OutgoingMessage(body, properties, routing_key))
+
+    def _run(self, index):
+        """Bucle de un publicador: tomar un lote de la cola y publicarlo con confirmación"""
+        channel = None
+        while self.running:
+            try:
+                outgoing = [self._queue.get(timeout=1)]
+            except queue.Empty:
+                continue
+            while len(outgoing) < self.batch:
+                try:
+                    outgoing.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            with self._lock:
+                self.outstanding += len(outgoing)
+            
+            for position, message in enumerate(outgoing):
+                try:
+                    if channel is None or not channel.is_open:
+                        channel = self.open_channel()
+                        channel.confirm_deliveries()
+                    if self.reply_to:
+                        message.properties['reply_to'] = self.reply_to()
+                    acked = Message.create(channel, message.body, message.properties).publish(
+                        routing_key=message.routing_key)
+                except Exception as e:
+                    channel = None
+                    _record_error(f"Publicador {index}: {str(e)}")
+                    logger.error(f"Error en publicador {index}: {str(e)}")
+                    acked = None
+                
+                with self._lock:
+                    self.outstanding -= 1
+                if acked:
+                    with self._lock:
+                        self.confirmed += 1
+                    PUBLISH_CONFIRMS.labels("ack").inc()
+                    continue
+                
+                PUBLISH_CONFIRMS.labels("nack" if acked is False else "error").inc()
+                if acked is False:
+                    with self._lock:
+                        self.nacked += 1
+                self._retry(message)
+                
+                # Sin canal, el resto del lote vuelve a la cola para otro intento
+                if acked is None:
+                    requeued = outgoing[position + 1:]
+                    with self._lock:
+                        self.outstanding -= len(requeued)
+                    for pending in requeued:
+                        self._queue.put(pending)
+                    time.sleep(1)
+                    break
+
+    def _retry(self, message):
+        """Reencolar un mensaje rechazado o dar la publicación por fallida"""
+        message.attempts += 1
+        if message.attempts <= self.max_retries:
+            with self._lock:
+                self.resent += 1
+            self._queue.put(message)
+            return
+        with self._lock:
+            self.failed += 1
+        logger.error(f"Publicación abandonada tras {message.attempts} intentos: "
+                     f"{message.properties.get('correlation_id')}")
+        if self.on_failure:
+            self.on_failure(message.properties)
+
+    def stop(self):
+        self.running = False
+
+    def stats(self):
+        """Estadísticas de publicación"""
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "outstanding": self.outstanding,
+                "confirmed": self.confirmed,
+                "nacked": self.nacked,
+                "resent": self.resent,
+                "failed": self.failed
+            }
+
+# Transporte AMQP del cliente
+class AmqpClientTransport(object):
+    """Conexión a RabbitMQ con respuestas por direct reply-to o cola exclusiva, consumo y heartbeat en hilos propios"""
+    def __init__(self, host, username, password, rpc_queue, vhost, port=5671, ssl=True, heartbeat=30,
+                 connection_factory=amqpstorm.Connection, confirm=CONFIRM_PUBLISH, direct_reply_to=DIRECT_REPLY_TO):
         self.host = host
         self.username = username
         self.password = password
@@ -47,24 +607,58 @@ class RpcClient(object):
         self.port = port
         self.ssl = ssl
         self.heartbeat = heartbeat
+        # Fábrica de conexiones compatible con amqpstorm.Connection (p. ej. un broker local de pruebas)
+        self.connection_factory = connection_factory
         self.channel = None
         self.connection = None
         self.callback_queue = None
         self.rpc_queue = rpc_queue
         self.consumer_thread = None
         self.heartbeat_thread = None
+        self.on_response = None
+        self.on_failure = None
+        self.on_connect = None
         self.should_reconnect = True
-        self.open()
+        # Con confirmaciones, las solicitudes se publican desde ConfirmedPublisher
+        self.confirm = confirm
+        self.publisher = None
+        # El canal principal solo lo usa el hilo consumidor; el resto publica con canales prestados
+        self.pool = ChannelPool(lambda: self.connection.channel())
+        # Direct reply-to exige publicar en el canal que consume las respuestas, incompatible con
+        # los canales propios de ConfirmedPublisher
+        if direct_reply_to and confirm:
+            logger.warning("Direct reply-to no es compatible con confirmaciones; se usará una cola exclusiva")
+        self.direct_reply_to = direct_reply_to and not confirm
+        self.direct = False
+        self._direct_lock = threading.Lock()
 
-    def open(self):
+    @property
+    def reply_to(self):
+        return self.callback_queue
+
+    @property
+    def reply_mode(self):
+        return 'direct' if self.direct else 'exclusive'
+
+    def open(self, on_response=None, on_failure=None, on_connect=None):
         """Abrir conexión con manejo de errores y reconexión"""
+        if on_response is not None:
+            self.on_response = on_response
+        if on_failure is not None:
+            self.on_failure = on_failure
+        if on_connect is not None:
+            self.on_connect = on_connect
         if self.connection and self.connection.is_open:
             return True
         
+        # Una conexión nueva puede llegar a otro servidor: avisar antes de publicar nada en ella
+        if self.on_connect is not None:
+            self.on_connect()
+        
         try:
             logger.info(f"Conectando a RabbitMQ: {self.host}:{self.port}")
             # Configurar conexión con tiempo de heartbeat reducido
-            self.connection = amqpstorm.Connection(
+            self.connection = self.connection_factory(
                 self.host, 
                 self.username,
                 self.password,
@@ -75,16 +669,13 @@ class RpcClient(object):
             )
             
             self.channel = self.connection.channel()
-            # Asegurar que la cola RPC exista
-            self.channel.queue.declare(self.rpc_queue)
+            self.pool.reset()
+            # Asegurar que existan las colas RPC de todos los carriles
+            for lane in LANES:
+                self.channel.queue.declare(lane_queue(self.rpc_queue, lane))
             
-            # Crear cola de respuestas exclusiva
-            result = self.channel.queue.declare(exclusive=True)
-            self.callback_queue = result['queue']
-            
-            # Configurar consumidor
-            self.channel.basic.consume(self._on_response, no_ack=True,
-                                      queue=self.callback_queue)
+            # Configurar consumidor de respuestas
+            self.callback_queue = self._consume_replies()
             
             # Iniciar hilo de consumo
             self._create_process_thread()
@@ -92,6 +683,13 @@ class RpcClient(object):
             # Iniciar hilo de heartbeat
             self._create_heartbeat_thread()
             
+            # Iniciar publicadores con confirmación; conservan su cola entre reconexiones
+            if self.confirm:
+                if self.publisher is None:
+                    self.publisher = ConfirmedPublisher(lambda: self.connection.channel(), on_failure=self.on_failure,
+                                                        reply_to=lambda: self.callback_queue)
+                self.publisher.start()
+            
             logger.info("Conectado exitosamente a RabbitMQ")
             CLIENT_STATUS["connected"] = True
             CLIENT_STATUS["last_reconnect"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -99,11 +697,29 @@ class RpcClient(object):
             return True
         except Exception as e:
             CLIENT_STATUS["connected"] = False
-            CLIENT_STATUS["errors"] += 1
-            CLIENT_STATUS["last_error"] = str(e)
+            _record_error(str(e))
             logger.error(f"Error al conectar con RabbitMQ: {str(e)}")
             return False
 
+    def _consume_replies(self):
+        """Consumir respuestas por direct reply-to o, si el broker no lo admite, por una cola exclusiva"""
+        if self.direct_reply_to:
+            try:
+                self.channel.basic.consume(self.on_response, queue=DIRECT_REPLY_QUEUE, no_ack=True)
+                self.direct = True
+                return DIRECT_REPLY_QUEUE
+            except AMQPChannelError as e:
+                # No volver a intentarlo en cada reconexión
+                logger.warning(f"Direct reply-to no disponible, se usará una cola exclusiva: {str(e)}")
+                self.direct_reply_to = False
+                # El broker cierra el canal al rechazar el consumo
+                self.channel = self.connection.channel()
+        
+        self.direct = False
+        result = self.channel.queue.declare(exclusive=True)
+        self.channel.basic.consume(self.on_response, no_ack=True, queue=result['queue'])
+        return result['queue']
+
     def _create_process_thread(self):
         """Crear hilo para procesar mensajes"""
         if self.consumer_thread and self.consumer_thread.is_alive():
@@ -129,14 +745,13 @@ class RpcClient(object):
                 if self.connection and self.connection.is_open:
                     self.channel.start_consuming(to_tuple=False)
             except Exception as e:
-                CLIENT_STATUS["errors"] += 1
-                CLIENT_STATUS["last_error"] = str(e)
+                _record_error(str(e))
                 logger.error(f"Error en hilo de consumo: {str(e)}")
                 CLIENT_STATUS["connected"] = False
                 
                 # Intentar reconectar
                 time.sleep(5)  # Esperar antes de reconectar
-                self._reconnect()
+                self.reconnect()
 
     def _heartbeat_loop(self):
         """Mantener la conexión viva enviando un comando liviano periódicamente"""
@@ -145,27 +760,27 @@ class RpcClient(object):
                 if self.connection and self.connection.is_open:
                     # En lugar de send_heartbeat(), usamos un comando liviano
                     # para mantener la conexión activa
-                    self.channel.basic.publish(
-                        body='',
-                        exchange='',
-                        routing_key='',
-                        properties={
-                            'delivery_mode': 1  # No persistente
-                        }
-                    )
+                    with self.pool.channel() as channel:
+                        channel.basic.publish(
+                            body='',
+                            exchange='',
+                            routing_key='',
+                            properties={
+                                'delivery_mode': 1  # No persistente
+                            }
+                        )
             except Exception as e:
-                CLIENT_STATUS["errors"] += 1
-                CLIENT_STATUS["last_error"] = f"Heartbeat error: {str(e)}"
+                _record_error(f"Heartbeat error: {str(e)}")
                 logger.error(f"Error en heartbeat: {str(e)}")
                 
                 # Intentar reconectar si el error es de conexión
                 if self.connection and not self.connection.is_open:
-                    self._reconnect()
+                    self.reconnect()
                 
             # Dormir por menos tiempo que el intervalo de heartbeat
             time.sleep(self.heartbeat // 2)
 
-    def _reconnect(self):
+    def reconnect(self):
         """Intentar reconectar al servidor RabbitMQ"""
         if not self.should_reconnect:
             return
@@ -182,57 +797,365 @@ class RpcClient(object):
         # Intentar reconectar
         self.open()
 
+    def publish(self, body, properties, routing_key):
+        """Publicar una solicitud con respuesta en la cola exclusiva"""
+        if self.publisher is not None:
+            self.publisher.publish(body, properties, routing_key)
+            return
+        if self.direct:
+            # Las respuestas directas solo llegan al canal que publicó la solicitud
+            with self._direct_lock:
+                message = Message.create(self.channel, body, properties)
+                message.reply_to = DIRECT_REPLY_QUEUE
+                message.publish(routing_key=routing_key)
+            return
+        with self.pool.channel() as channel:
+            message = Message.create(channel, body, properties)
+            message.reply_to = self.callback_queue
+            message.publish(routing_key=routing_key)
+
+    def queue_depth(self):
+        """Mensajes pendientes en la cola RPC, con una declaración pasiva"""
+        with self.pool.channel() as channel:
+            return channel.queue.declare(self.rpc_queue, passive=True)['message_count']
+
+    def is_connected(self):
+        """Verificar conexión"""
+        return bool(self.connection and self.connection.is_open)
+
+    def close(self):
+        """Cerrar conexión"""
+        self.should_reconnect = False
+        if self.publisher is not None:
+            self.publisher.stop()
+        if self.connection:
+            try:
+                self.connection.close()
+            except:
+                pass
+
+# Clase de Cliente RPC mejorada
+class RpcClient(object):
+    def __init__(self, host, username, password, rpc_queue, vhost, port=5671, ssl=True, heartbeat=30, cache=None,
+                 framed=FRAMED_PROTOCOL, transport=None, coalesce=COALESCE_REQUESTS):
+        self.queue = PendingReplyTable()
+        self.cache = cache
+        # Solicitudes en vuelo por clave de payload, para unir las idénticas
+        self.coalesce = coalesce
+        self._in_flight = {}
+        self._flight_lock = threading.Lock()
+        self.framed = framed
+        # Versión del protocolo binario anunciada por el servidor (None = solo texto)
+        self.frame_version = None
+        self.rpc_queue = rpc_queue
+        # Por defecto se usa RabbitMQ; otro transporte puede inyectarse
+        self.transport = transport or AmqpClientTransport(host, username, password, rpc_queue, vhost,
+                                                          port, ssl, heartbeat)
+        self.open()
+
+    def open(self):
+        """Abrir el transporte registrando el manejador de respuestas"""
+        return self.transport.open(self._on_response, self._on_publish_failure, self._on_connect)
+
+    def _on_connect(self):
+        """Volver a negociar el protocolo: el servidor de la nueva conexión puede ser otro"""
+        self.frame_version = None
+
+    def _reconnect(self):
+        """Intentar reconectar el transporte"""
+        self.transport.reconnect()
+
+    def _publish(self, corr_id, body, properties=None, timeout=None, lane=LANE_INTERACTIVE):
+        """Publicar un mensaje en la cola del carril con el correlation_id dado y el plazo de quien espera"""
+        properties = dict(properties or {})
+        properties['correlation_id'] = corr_id
+        apply_deadline(properties, timeout or self.queue.ttl)
+        self.transport.publish(body, properties, lane_queue(self.rpc_queue, lane))
+        LANE_REQUESTS.labels(lane).inc()
+
+    def pick_lane(self, payload):
+        """Carril por tamaño: los textos grandes van al masivo"""
+        return LANE_BULK if len(payload) >= BULK_THRESHOLD else LANE_INTERACTIVE
+
     def _on_response(self, message):
         """Manejar respuestas"""
         try:
-            self.queue[message.correlation_id] = message.body
+            body = message.body
+            headers = message.properties.get('headers') or {}
+            
+            # Negociación: el servidor anuncia la versión de protocolo que entiende
+            if self.framed and headers.get(FRAME_VERSION_HEADER) == FRAME_VERSION:
+                self.frame_version = FRAME_VERSION
+            
+            if message.message_type == STREAM_MESSAGE_TYPE:
+                if not self.queue.deliver_chunk(message.correlation_id, headers.get(STREAM_INDEX_HEADER), body):
+                    logger.warning(f"Fragmento tardío descartado: {message.correlation_id}")
+                return
+            
+            if message.content_type == FRAME_CONTENT_TYPE:
+                frame = decode_frame(body)
+                body = frame.text if frame.status == STATUS_OK else f"ERROR: {frame.text}"
+            
+            trace = (headers, now_us()) if TRACE_CLIENT_SEND in headers else None
+            pending = self.queue.complete(message.correlation_id, body, trace)
+            if pending is None:
+                logger.warning(f"Respuesta tardía descartada: {message.correlation_id}")
+            elif pending.cache_key is not None and not body.startswith("ERROR:"):
+                self.cache.put(pending.cache_key, body)
         except Exception as e:
-            CLIENT_STATUS["errors"] += 1
-            CLIENT_STATUS["last_error"] = str(e)
+            _record_error(str(e))
             logger.error(f"Error en manejador de respuestas: {str(e)}")
 
-    def send_request(self, payload):
-        """Enviar solicitud con manejo de errores"""
+    def _on_publish_failure(self, properties):
+        """Completar con error una solicitud que el broker no aceptó"""
+        if properties.get('message_type') == STREAM_MESSAGE_TYPE:
+            # El flujo terminará por timeout al faltar el fragmento
+            return
+        self.queue.complete(properties.get('correlation_id'), "ERROR: El broker no confirmó la solicitud")
+
+    def send_request(self, payload, timeout=None, lane=None):
+        """Enviar solicitud con manejo de errores; sin carril explícito se elige por tamaño"""
+        pending = None
         try:
+            comando, _, texto = payload.partition(':')
+            operation = operation_label(comando)
+            
+            # Consultar la caché local; un acierto no pasa por el broker
+            key = cache_key(payload) if self.cache else None
+            if key is not None:
+                result = self.cache.get(key)
+                if result is not None:
+                    corr_id = str(uuid.uuid4())
+                    self.queue.add_result(corr_id, result, timeout, operation)
+                    return corr_id
+            
             # Verificar y reconectar si es necesario
-            if not self.connection or not self.connection.is_open:
+            if not self.is_connected():
                 if not self.open():
                     return None
                     
-            # Crear mensaje
-            message = Message.create(self.channel, payload)
-            message.reply_to = self.callback_queue
+            # Crear mensaje, en formato binario si ya se negoció
+            if self.frame_version:
+                body = encode_frame(comando, texto)
+                properties = {'content_type': FRAME_CONTENT_TYPE}
+            else:
+                body = payload
+                properties = {}
             
-            # Crear entrada en diccionario
-            self.queue[message.correlation_id] = None
+            # Registrar la respuesta pendiente antes de publicar, o unirse a una idéntica en vuelo
+            if self.coalesce:
+                corr_id, pending = self._join_or_lead(key or cache_key(payload), timeout, key, operation)
+                if pending is None:
+                    return corr_id
+            else:
+                corr_id = str(uuid.uuid4())
+                pending = self.queue.add(corr_id, timeout, key, operation)
             
-            # Publicar solicitud
-            message.publish(routing_key=self.rpc_queue)
+            # Publicar solicitud, marcando la hora de envío si se traza
+            if should_sample():
+                properties['headers'] = {TRACE_CLIENT_SEND: now_us()}
+            self._publish(corr_id, body, properties, timeout, lane or self.pick_lane(payload))
+            CLIENT_REQUESTS.labels(operation).inc()
             
-            return message.correlation_id
+            return corr_id
         except Exception as e:
-            CLIENT_STATUS["errors"] += 1
-            CLIENT_STATUS["last_error"] = str(e)
+            _record_error(str(e))
             logger.error(f"Error al enviar solicitud: {str(e)}")
+            if pending is not None:
+                # Nadie esperará esta respuesta: retirarla para que deje de contar como en vuelo
+                self.queue.pop(pending.corr_id)
+                # Las solicitudes unidas a esta no recibirán respuesta del servidor: liberarlas ya
+                pending.set_result(f"ERROR: No se pudo publicar la solicitud: {str(e)}")
+                self._land(pending)
             
             # Intentar reconectar
             self._reconnect()
             return None
 
+    def _join_or_lead(self, flight_key, timeout, key, operation):
+        """Unirse a una solicitud idéntica en vuelo o registrar esta como la que se publica
+
+        Devuelve (corr_id, pending); pending es None si la solicitud se unió a otra y no hay que publicarla.
+        """
+        corr_id = str(uuid.uuid4())
+        with self._flight_lock:
+            leader = self._in_flight.get(flight_key)
+            # Solo unirse si la solicitud en vuelo vive al menos tanto como esta: si no, al vencer
+            # la primera se descartaría la respuesta que la segunda aún espera
+            if (leader is not None and not leader.done()
+                    and leader.deadline >= time.monotonic() + (timeout or self.queue.ttl)
+                    and self.queue.get(leader.corr_id) is leader):
+                self.queue.add_follower(corr_id, leader, timeout)
+                COALESCED.inc()
+                return corr_id, None
+            pending = self.queue.add(corr_id, timeout, key, operation)
+            pending.flight_key = flight_key
+            self._in_flight[flight_key] = pending
+        pending.add_done_callback(self._land)
+        return corr_id, pending
+
+    def _land(self, pending):
+        """Dejar de ofrecer una solicitud para unirse a ella"""
+        if pending.flight_key is None:
+            return
+        with self._flight_lock:
+            if self._in_flight.get(pending.flight_key) is pending:
+                del self._in_flight[pending.flight_key]
+
+    def send_batch(self, items, timeout=None, lane=LANE_BULK):
+        """Enviar un lote [{operation, text}, ...] como un único mensaje RPC"""
+        corr_id = None
+        try:
+            if not self.is_connected():
+                if not self.open():
+                    return None
+            
+            corr_id = str(uuid.uuid4())
+            self.queue.add(corr_id, timeout, operation="lote")
+            self._publish(corr_id, json.dumps(items), {
+                'content_type': 'application/json',
+                'message_type': BATCH_MESSAGE_TYPE
+            }, timeout, lane)
+            CLIENT_REQUESTS.labels("lote").inc()
+            
+            return corr_id
+        except Exception as e:
+            _record_error(str(e))
+            logger.error(f"Error al enviar lote: {str(e)}")
+            if corr_id is not None:
+                self.queue.pop(corr_id)
+            
+            self._reconnect()
+            return None
+
+    def stream_request(self, operation, chunks, timeout=10, window=STREAM_WINDOW, lane=LANE_BULK):
+        """Publicar fragmentos de texto y producir sus resultados en orden a medida que llegan"""
+        if not self.is_connected():
+            if not self.open():
+                raise ConnectionError("No se pudo conectar con el transporte RPC")
+        
+        stream_id = str(uuid.uuid4())
+        pending = self.queue.add_stream(stream_id, timeout)
+        CLIENT_REQUESTS.labels(operation_label(operation)).inc()
+        sent = 0
+        received = 0
+        
+        try:
+            for chunk in chunks:
+                self._publish(stream_id, f"{operation}:{chunk}", {
+                    'message_type': STREAM_MESSAGE_TYPE,
+                    'headers': {STREAM_INDEX_HEADER: sent}
+                }, timeout, lane)
+                sent += 1
+                
+                # Limitar los fragmentos en vuelo para acotar la memoria
+                while sent - received >= window:
+                    yield self._next_chunk(pending, timeout)
+                    received += 1
+            
+            while received < sent:
+                yield self._next_chunk(pending, timeout)
+                received += 1
+        finally:
+            self.queue.pop(stream_id)
+
+    def _next_chunk(self, pending, timeout):
+        """Esperar la respuesta del siguiente fragmento"""
+        body = pending.next(timeout)
+        if body is None:
+            raise TimeoutError("No se recibió respuesta de un fragmento")
+        return body
+
+    def queue_depth(self):
+        """Mensajes pendientes en la cola RPC"""
+        return self.transport.queue_depth()
+
+    def on_reply(self, corr_id, callback):
+        """Ejecutar callback(body) al llegar la respuesta, sin bloquear; devuelve False si no está pendiente"""
+        pending = self.queue.get(corr_id)
+        if pending is None:
+            return False
+
+        def _deliver(p):
+            # Nadie llamará a wait_response: liberar aquí la entrada
+            self.queue.pop(corr_id)
+            self._land(p)
+            callback(p.body)
+
+        pending.add_done_callback(_deliver)
+        return True
+
+    def wait_response(self, corr_id, timeout=10):
+        """Bloquear hasta recibir la respuesta o agotar el timeout"""
+        pending = self.queue.get(corr_id)
+        if pending is None:
+            return None
+        started = time.monotonic()
+        try:
+            body = pending.wait(timeout)
+            record_trace(pending)
+            return body
+        finally:
+            REPLY_WAIT.labels(pending.operation).observe(time.monotonic() - started)
+            self.queue.pop(corr_id)
+            self._land(pending)
+
     def is_connected(self):
         """Verificar conexión"""
-        return self.connection and self.connection.is_open
+        return self.transport.is_connected()
 
     def close(self):
-        """Cerrar conexión"""
-        self.should_reconnect = False
-        if self.connection:
-            try:
-                self.connection.close()
-            except:
-                pass
+        """Cerrar conexión y liberar las respuestas pendientes"""
+        self.transport.close()
+        self.queue.clear("ERROR: El cliente RPC se cerró antes de recibir la respuesta")
         CLIENT_STATUS["connected"] = False
 
+# Cliente RPC asíncrono sobre el consumidor del cliente síncrono
+class AsyncRpcClient(object):
+    """Fachada asyncio: las corrutinas esperan la respuesta sin ocupar un hilo"""
+    def __init__(self, client):
+        self.client = client
+
+    async def call(self, operation, text, timeout=10, lane=None):
+        """Enviar operación y esperar el resultado; devuelve None si hay error o timeout"""
+        loop = asyncio.get_running_loop()
+        # Publicar puede esperar un canal libre o reconectar: fuera del bucle de eventos
+        corr_id = await asyncio.to_thread(self.client.send_request, f"{operation}:{text}", timeout=timeout, lane=lane)
+        if not corr_id:
+            return None
+        
+        pending = self.client.queue.get(corr_id)
+        if pending is None:
+            return None
+        
+        future = loop.create_future()
+        started = time.monotonic()
+        
+        def _resolve(body):
+            if not future.done():
+                future.set_result(body)
+        
+        # El callback llega desde el hilo consumidor
+        pending.add_done_callback(lambda p: loop.call_soon_threadsafe(_resolve, p.body))
+        
+        try:
+            body = await asyncio.wait_for(future, timeout)
+            record_trace(pending)
+            return body
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            REPLY_WAIT.labels(pending.operation).observe(time.monotonic() - started)
+            self.client.queue.pop(corr_id)
+            self.client._land(pending)
+
+def get_async_client():
+    """Obtener el cliente asíncrono ligado al cliente RPC actual"""
+    client = get_rpc_client()
+    if client is None:
+        return None
+    return AsyncRpcClient(client)
+
 def get_rpc_client():
     """Obtener el cliente RPC, inicializándolo si es necesario"""
     global RPC_CLIENT
@@ -265,16 +1188,44 @@ def init_client():
         RABBIT_VHOST,
         RABBIT_PORT,
         RABBIT_SSL,
-        HEARTBEAT_INTERVAL
+        HEARTBEAT_INTERVAL,
+        cache=ResultCache(CLIENT_CACHE_ENTRIES, CLIENT_CACHE_BYTES) if CLIENT_CACHE_ENTRIES > 0 else None,
+        # Dentro del mismo proceso las tramas binarias y la compresión solo añaden copias
+        framed=FRAMED_PROTOCOL and RPC_TRANSPORT != TRANSPORT_LOCAL,
+        transport=InProcessClientTransport(RPC_QUEUE) if RPC_TRANSPORT == TRANSPORT_LOCAL else None
     )
     
     logger.info(f"Cliente RPC inicializado. Conectado: {RPC_CLIENT.is_connected()}")
     return RPC_CLIENT.is_connected()
 
+def client_in_flight():
+    """Solicitudes en vuelo del cliente RPC actual"""
+    return RPC_CLIENT.queue.in_flight() if RPC_CLIENT else 0
+
+def client_queue_depth():
+    """Profundidad de la cola RPC según el cliente actual, sin inicializarlo; None si no está conectado"""
+    client = RPC_CLIENT
+    return client.queue_depth() if client and client.is_connected() else None
+
 def get_client_status():
     """Obtener estado del cliente"""
+    CLIENT_STATUS["processed_messages"] = CLIENT_REPLIES.value
+    CLIENT_STATUS["errors"] = CLIENT_ERRORS.value
     if RPC_CLIENT:
         CLIENT_STATUS["connected"] = RPC_CLIENT.is_connected()
+        CLIENT_STATUS["pending_replies"] = RPC_CLIENT.queue.stats()
+        if RPC_CLIENT.cache:
+            CLIENT_STATUS["cache"] = RPC_CLIENT.cache.stats()
+        CLIENT_STATUS["frame_version"] = RPC_CLIENT.frame_version
+        CLIENT_STATUS["coalesced"] = COALESCED.value
+        CLIENT_STATUS["lanes"] = {lane: LANE_REQUESTS.labels(lane).value for lane in LANES}
+        CLIENT_STATUS["reply_mode"] = RPC_CLIENT.transport.reply_mode
+        pool = getattr(RPC_CLIENT.transport, 'pool', None)
+        if pool is not None:
+            CLIENT_STATUS["channel_pool"] = pool.stats()
+        publisher = getattr(RPC_CLIENT.transport, 'publisher', None)
+        if publisher is not None:
+            CLIENT_STATUS["publisher"] = publisher.stats()
     
     return CLIENT_STATUS
 
@@ -0,0 +1,182 @@
+import os
+import sys
+import time
+import hashlib
+import datetime
+import threading
+from collections import OrderedDict, deque
+from itertools import islice
+
+# Historial de operaciones guardado en el servidor; la cookie de sesión solo lleva el id
+HISTORY_PER_SESSION = int(os.environ.get('HISTORY_PER_SESSION', 100))  # Elementos conservados por sesión
+HISTORY_MAX_SESSIONS = int(os.environ.get('HISTORY_MAX_SESSIONS', 10000))  # Sesiones conservadas; se expulsan las menos usadas
+HISTORY_MAX_BYTES = int(os.environ.get('HISTORY_MAX_BYTES', 64 * 1024 * 1024))  # Bytes máximos de textos completos
+HISTORY_PREVIEW_CHARS = int(os.environ.get('HISTORY_PREVIEW_CHARS', 30))  # Caracteres de la vista previa
+HISTORY_PAGE_SIZE = int(os.environ.get('HISTORY_PAGE_SIZE', 20))  # Elementos por página en la interfaz
+
+def text_digest(texto):
+    """Identificador de un texto por su contenido"""
+    return hashlib.blake2b(texto.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+def _text_id(entry):
+    """Id de una entrada de TextStore, o None si no se guardó o ya se expulsó"""
+    return entry[0] if entry is not None and entry[1] is not None else None
+
+class HistoryItem(object):
+    """Registro compacto: vistas previas y referencias a los textos completos"""
+    __slots__ = ('timestamp', 'operation', 'input_preview', 'result_preview', 'input_ref', 'result_ref',
+                 'input_length', 'result_length')
+
+    def __init__(self, operation, input_text, result, input_ref, result_ref, preview_chars):
+        self.timestamp = time.time()
+        self.operation = operation
+        self.input_preview = input_text[:preview_chars]
+        self.result_preview = result[:preview_chars]
+        # Entradas de TextStore (o None si el texto no se guardó)
+        self.input_ref = input_ref
+        self.result_ref = result_ref
+        self.input_length = len(input_text)
+        self.result_length = len(result)
+
+    def to_dict(self):
+        """Datos para la interfaz"""
+        return {
+            'timestamp': datetime.datetime.fromtimestamp(self.timestamp).strftime("%d/%m/%Y %H:%M:%S"),
+            'operation': self.operation,
+            'input_text': self.input_preview,
+            'input_truncated': self.input_length > len(self.input_preview),
+            'input_id': _text_id(self.input_ref),
+            'result': self.result_preview,
+            'result_truncated': self.result_length > len(self.result_preview),
+            'result_id': _text_id(self.result_ref)
+        }
+
+# Textos completos guardados una sola vez por contenido
+class TextStore(object):
+    """Textos con contador de referencias; si se supera el límite de bytes se expulsan los menos usados"""
+    def __init__(self, max_bytes=HISTORY_MAX_BYTES):
+        self.max_bytes = max_bytes
+        # Un texto no puede ocupar más de una fracción del almacén
+        self.max_item_bytes = max_bytes // 8
+        self._texts = OrderedDict()
+        self.bytes = 0
+        self.evictions = 0
+
+    def add(self, texto):
+        """Guardar un texto o sumar una referencia; devuelve su entrada [id, texto, bytes, referencias]
+
+        Requiere el lock del historial.
+        """
+        digest = text_digest(texto)
+        entry = self._texts.get(digest)
+        if entry is not None:
+            entry[3] += 1
+            self._texts.move_to_end(digest)
+            return entry
+
+        size = sys.getsizeof(texto)
+        if size > self.max_item_bytes:
+            return None
+        entry = self._texts[digest] = [digest, texto, size, 1]
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, evicted = self._texts.popitem(last=False)
+            self.bytes -= evicted[2]
+            # Los elementos que aún la referencian conservan solo la vista previa
+            evicted[1] = None
+            self.evictions += 1
+        return entry
+
+    def release(self, entry):
+        """Quitar una referencia y borrar el texto si nadie lo usa (requiere el lock del historial)"""
+        # Una entrada expulsada pudo volver a guardarse con el mismo id: esa nueva no es de quien libera
+        if self._texts.get(entry[0]) is not entry:
+            return
+        entry[3] -= 1
+        if entry[3] <= 0:
+            del self._texts[entry[0]]
+            self.bytes -= entry[2]
+
+    def get(self, digest):
+        entry = self._texts.get(digest)
+        return entry[1] if entry is not None else None
+
+    def __len__(self):
+        return len(self._texts)
+
+# Historial por id de sesión
+class HistoryStore(object):
+    """Elementos recientes por sesión, más nuevos primero, con límites por sesión, sesiones y bytes"""
+    def __init__(self, per_session=HISTORY_PER_SESSION, max_sessions=HISTORY_MAX_SESSIONS,
+                 max_bytes=HISTORY_MAX_BYTES, preview_chars=HISTORY_PREVIEW_CHARS):
+        self.per_session = per_session
+        self.max_sessions = max_sessions
+        self.preview_chars = preview_chars
+        self.texts = TextStore(max_bytes)
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, session_id, operation, input_text, result):
+        """Añadir un elemento al principio del historial de una sesión"""
+        with self._lock:
+            items = self._sessions.get(session_id)
+            if items is None:
+                items = self._sessions[session_id] = deque()
+                while len(self._sessions) > self.max_sessions:
+                    _, evicted = self._sessions.popitem(last=False)
+                    self._release(evicted)
+            else:
+                self._sessions.move_to_end(session_id)
+
+            item = HistoryItem(operation, input_text, result, self.texts.add(input_text), self.texts.add(result),
+                               self.preview_chars)
+            items.appendleft(item)
+            while len(items) > self.per_session:
+                self._release((items.pop(),))
+
+    def page(self, session_id, page=1, per_page=HISTORY_PAGE_SIZE):
+        """Devolver (elementos de la página, total de elementos) de una sesión"""
+        start = (max(page, 1) - 1) * per_page
+        with self._lock:
+            items = self._sessions.get(session_id)
+            if not items:
+                return [], 0
+            selected = list(islice(items, start, start + per_page))
+            total = len(items)
+        return [item.to_dict() for item in selected], total
+
+    def text(self, session_id, digest):
+        """Texto completo por su id, solo si lo referencia un elemento de la sesión; None si no"""
+        # El id depende solo del contenido: sin esta comprobación cualquiera podría confirmar y
+        # descargar un texto de otra sesión calculando su hash
+        with self._lock:
+            items = self._sessions.get(session_id) or ()
+            if not any(digest in (_text_id(item.input_ref), _text_id(item.result_ref)) for item in items):
+                return None
+            return self.texts.get(digest)
+
+    def clear(self, session_id):
+        """Borrar el historial de una sesión"""
+        with self._lock:
+            items = self._sessions.pop(session_id, None)
+            if items:
+                self._release(items)
+
+    def _release(self, items):
+        """Liberar los textos de los elementos eliminados (requiere el lock)"""
+        for item in items:
+            for entry in (item.input_ref, item.result_ref):
+                if entry is not None:
+                    self.texts.release(entry)
+
+    def stats(self):
+        """Estadísticas del historial"""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "items": sum(len(items) for items in self._sessions.values()),
+                "texts": len(self.texts),
+                "bytes": self.texts.bytes,
+                "max_bytes": self.texts.max_bytes,
+                "evictions": self.texts.evictions
+            }
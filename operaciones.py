@@ -0,0 +1,209 @@
+import threading
+import time
+import codecs
+
+# Clases de costo de las operaciones
+COST_CONSTANT = "constante"  # No depende del tamaño del texto
+COST_LIGHT = "ligera"        # Lineal, pero una copia de memoria barata
+COST_HEAVY = "pesada"        # Lineal y con trabajo por carácter; candidata al pool de procesos
+
+# Cómo se combina una operación aplicada por fragmentos cortados en espacios en blanco
+CHUNK_MAP = "map"  # El resultado es la concatenación de los resultados de cada fragmento
+CHUNK_SUM = "sum"  # El resultado es la suma de los resultados numéricos de cada fragmento
+
+# Separador de comandos en una tubería
+PIPELINE_SEPARATOR = "|"
+
+# Operación registrada
+class Operation(object):
+    """Manejador de un comando junto con sus metadatos y estadísticas"""
+    __slots__ = ('id', 'handler', 'name', 'icon', 'description', 'cost', 'idempotent',
+                 'preserves_words', 'preserves_length', 'joinable', 'chunking', 'listed',
+                 'calls', 'total_time', '_lock')
+
+    def __init__(self, id, handler, name, icon, description, cost=COST_HEAVY, idempotent=False,
+                 preserves_words=False, preserves_length=False, joinable=False, chunking=None, listed=True):
+        self.id = id
+        self.handler = handler
+        self.name = name
+        self.icon = icon
+        self.description = description
+        self.cost = cost
+        # Aplicarla dos veces seguidas equivale a aplicarla una vez
+        self.idempotent = idempotent
+        # No cambia el número de palabras / la longitud del texto
+        self.preserves_words = preserves_words
+        self.preserves_length = preserves_length
+        # Se puede aplicar a varios textos unidos por un separador neutro
+        self.joinable = joinable
+        # Modo de combinación por fragmentos (CHUNK_MAP, CHUNK_SUM o None)
+        self.chunking = chunking
+        # Se muestra en la interfaz
+        self.listed = listed
+        self.calls = 0
+        self.total_time = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, texto):
+        """Ejecutar la operación registrando llamadas y tiempo"""
+        start = time.perf_counter()
+        try:
+            return self.handler(texto)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.calls += 1
+                self.total_time += elapsed
+
+    def info(self):
+        """Datos para la interfaz"""
+        return {"id": self.id, "name": self.name, "icon": self.icon, "description": self.description}
+
+    def stats(self):
+        """Estadísticas de uso"""
+        with self._lock:
+            return {"calls": self.calls, "total_time": round(self.total_time, 6), "cost": self.cost}
+
+# Registro de operaciones indexado por comando
+OPERATIONS = {}
+
+def register_operation(id, name, icon, description, **metadata):
+    """Decorador para registrar un manejador de texto bajo un comando"""
+    def decorator(handler):
+        OPERATIONS[id] = Operation(id, handler, name, icon, description, **metadata)
+        return handler
+    return decorator
+
+def get_operation(comando):
+    """Obtener la operación registrada para un comando, o None"""
+    return OPERATIONS.get(comando)
+
+def list_operations():
+    """Operaciones visibles en la interfaz, en orden de registro"""
+    return [op.info() for op in OPERATIONS.values() if op.listed]
+
+def help_text():
+    """Texto de ayuda generado a partir del registro"""
+    return "Comandos disponibles: " + ", ".join(op.id for op in OPERATIONS.values() if op.listed)
+
+def chunking_mode(comando):
+    """Modo por fragmentos de un comando o tubería: solo pasos CHUNK_MAP, con un CHUNK_SUM opcional al final"""
+    steps = comando.split(PIPELINE_SEPARATOR)
+    modes = []
+    for step in steps:
+        operation = get_operation(step)
+        if operation is None or operation.chunking is None:
+            return None
+        modes.append(operation.chunking)
+    if all(mode == CHUNK_MAP for mode in modes[:-1]):
+        return modes[-1]
+    return None
+
+def iter_chunks(read, size):
+    """Leer bytes UTF-8 con read(n) y producir fragmentos de texto cortados tras un espacio en blanco"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    while True:
+        data = read(size)
+        buffer += decoder.decode(data, final=not data)
+        if not data:
+            break
+        if len(buffer) < size:
+            continue
+        # Cortar después del último espacio; sin espacios se sigue acumulando
+        cut = len(buffer)
+        while cut > 0 and not buffer[cut - 1].isspace():
+            cut -= 1
+        if cut:
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+    if buffer:
+        yield buffer
+
+def split_chunks(texto, pieces):
+    """Dividir un texto en como mucho `pieces` fragmentos cortados tras un espacio en blanco"""
+    size = -(-len(texto) // max(pieces, 1))
+    chunks = []
+    start = 0
+    while start < len(texto):
+        cut = start + size
+        if cut >= len(texto):
+            chunks.append(texto[start:])
+            break
+        # Avanzar hasta el siguiente espacio; sin espacios el resto va en un solo fragmento
+        while cut < len(texto) and not texto[cut - 1].isspace():
+            cut += 1
+        chunks.append(texto[start:cut])
+        start = cut
+    return chunks
+
+def merge_chunks(mode, results):
+    """Combinar los resultados por fragmento según el modo CHUNK_MAP o CHUNK_SUM"""
+    if mode == CHUNK_SUM:
+        return str(sum(int(result) for result in results))
+    return ''.join(results)
+
+def operation_stats():
+    """Estadísticas de uso por operación"""
+    return {op.id: op.stats() for op in OPERATIONS.values()}
+
+def operation_label(comando):
+    """Etiqueta acotada para métricas: el id registrado, 'pipeline' u 'otra'"""
+    comando = comando.strip().lower()
+    if comando in OPERATIONS:
+        return comando
+    return "pipeline" if PIPELINE_SEPARATOR in comando else "otra"
+
+# Operaciones disponibles
+@register_operation("mayusculas", "Convertir a MAYÚSCULAS", "arrow-up-square", "Convierte todo el texto a mayúsculas",
+                    idempotent=True, preserves_words=True, joinable=True, chunking=CHUNK_MAP)
+def mayusculas(texto):
+    return texto.upper()
+
+@register_operation("minusculas", "Convertir a minúsculas", "arrow-down-square", "Convierte todo el texto a minúsculas",
+                    idempotent=True, preserves_words=True, joinable=True, chunking=CHUNK_MAP)
+def minusculas(texto):
+    return texto.lower()
+
+@register_operation("invertir", "Invertir texto", "arrow-left-right", "Invierte el orden de los caracteres del texto",
+                    preserves_words=True, preserves_length=True, joinable=True)
+def invertir(texto):
+    return texto[::-1]
+
+@register_operation("longitud", "Longitud del texto", "rulers", "Cuenta el número de caracteres en el texto",
+                    cost=COST_CONSTANT, chunking=CHUNK_SUM)
+def longitud(texto):
+    return str(len(texto))
+
+@register_operation("capitalizar", "Capitalizar", "type-bold", "Convierte a mayúscula la primera letra del texto",
+                    preserves_words=True)
+def capitalizar(texto):
+    return texto.capitalize()
+
+@register_operation("titulo", "Formato título", "card-heading", "Convierte a mayúscula la primera letra de cada palabra",
+                    preserves_words=True, joinable=True, chunking=CHUNK_MAP)
+def titulo(texto):
+    return texto.title()
+
+@register_operation("intercambiar_caso", "Intercambiar caso", "arrow-down-up", "Invierte mayúsculas/minúsculas",
+                    preserves_words=True, joinable=True, chunking=CHUNK_MAP)
+def intercambiar_caso(texto):
+    return texto.swapcase()
+
+@register_operation("contar_palabras", "Contar palabras", "list-ol", "Cuenta el número de palabras en el texto",
+                    chunking=CHUNK_SUM)
+def contar_palabras(texto):
+    return str(len(texto.split()))
+
+@register_operation("recortar", "Recortar espacios", "scissors", "Elimina espacios al inicio y final del texto",
+                    cost=COST_LIGHT, idempotent=True, preserves_words=True)
+def recortar(texto):
+    return texto.strip()
+
+@register_operation("ayuda", "Ayuda", "question-circle", "Lista los comandos disponibles",
+                    cost=COST_CONSTANT, listed=False)
+def ayuda(texto):
+    return help_text()
+
+# Lista de operaciones disponibles (para la interfaz)
+TEXT_OPERATIONS = list_operations()
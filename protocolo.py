@@ -0,0 +1,108 @@
+import struct
+import time
+import zlib
+from collections import namedtuple
+
+# Protocolo binario de mensajes RPC
+#
+# Cabecera (big-endian, 13 bytes):
+#   magic (2s) | versión (B) | flags (B) | codificación (B) | estado (H) | long. operación (H) | long. cuerpo (I)
+# seguida de la operación en UTF-8 y del cuerpo (texto UTF-8, comprimido según la codificación).
+FRAME_MAGIC = b'TP'
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct('!2sBBBHHI')
+FRAME_CONTENT_TYPE = 'application/x-textpro-frame'
+FRAME_VERSION_HEADER = 'x-frame-version'  # Anunciado por el servidor en sus respuestas
+DEADLINE_HEADER = 'x-deadline'  # Plazo absoluto de una solicitud, en milisegundos desde la época
+
+# Carriles de prioridad: cada uno con su propia cola, para que el trabajo masivo no retrase al interactivo
+LANE_INTERACTIVE = 'interactive'
+LANE_BULK = 'bulk'
+LANES = (LANE_INTERACTIVE, LANE_BULK)
+
+# Tipos de mensaje (propiedad message_type) compartidos por cliente y servidor
+BATCH_MESSAGE_TYPE = 'batch'  # Lote JSON de solicitudes
+STREAM_MESSAGE_TYPE = 'chunk'  # Fragmento 'comando:texto' de un flujo
+STREAM_INDEX_HEADER = 'x-stream-index'  # Cabecera con la posición del fragmento en el flujo
+
+# Flags
+FLAG_REPLY = 0x01
+
+# Codificaciones del cuerpo
+ENCODING_IDENTITY = 0
+ENCODING_ZLIB = 1
+
+# Códigos de estado
+STATUS_OK = 200
+STATUS_BAD_REQUEST = 400
+STATUS_ERROR = 500
+
+# Tamaño a partir del cual se intenta comprimir el cuerpo
+COMPRESS_THRESHOLD = 64 * 1024
+COMPRESS_LEVEL = 1
+
+def apply_deadline(properties, timeout):
+    """Limitar la vida de una solicitud: expiración en la cola del broker y plazo absoluto en cabecera"""
+    timeout_ms = max(1, int(timeout * 1000))
+    properties['expiration'] = str(timeout_ms)
+    headers = properties.setdefault('headers', {})
+    headers[DEADLINE_HEADER] = int(time.time() * 1000) + timeout_ms
+    return properties
+
+def lane_queue(rpc_queue, lane):
+    """Cola de un carril; el interactivo usa la cola RPC original"""
+    return rpc_queue if lane == LANE_INTERACTIVE else f"{rpc_queue}.{lane}"
+
+def deadline_expired(headers):
+    """Indicar si ya pasó el plazo de una solicitud (sin plazo nunca expira)"""
+    deadline = headers.get(DEADLINE_HEADER)
+    return deadline is not None and time.time() * 1000 > deadline
+
+Frame = namedtuple('Frame', ['operation', 'text', 'status', 'flags'])
+
+class ProtocolError(ValueError):
+    """Mensaje que no respeta el formato binario"""
+    pass
+
+def encode_frame(operation, text, status=STATUS_OK, flags=0, compress_threshold=COMPRESS_THRESHOLD):
+    """Codificar una operación y su texto en un mensaje binario"""
+    op = operation.encode('utf-8')
+    body = text.encode('utf-8', 'surrogatepass')
+    encoding = ENCODING_IDENTITY
+
+    if compress_threshold is not None and len(body) >= compress_threshold:
+        compressed = zlib.compress(body, COMPRESS_LEVEL)
+        if len(compressed) < len(body):
+            body = compressed
+            encoding = ENCODING_ZLIB
+
+    header = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, flags, encoding, status, len(op), len(body))
+    return b''.join((header, op, body))
+
+def decode_frame(data):
+    """Decodificar un mensaje binario; lanza ProtocolError si el formato es inválido"""
+    if isinstance(data, str):
+        data = data.encode('utf-8', 'surrogatepass')
+    if len(data) < FRAME_HEADER.size:
+        raise ProtocolError("Mensaje demasiado corto")
+
+    magic, version, flags, encoding, status, op_length, body_length = FRAME_HEADER.unpack_from(data)
+    if magic != FRAME_MAGIC:
+        raise ProtocolError("Prefijo de mensaje desconocido")
+    if version != FRAME_VERSION:
+        raise ProtocolError(f"Versión de protocolo no soportada: {version}")
+
+    start = FRAME_HEADER.size
+    if len(data) != start + op_length + body_length:
+        raise ProtocolError("Longitud de mensaje inconsistente")
+
+    view = memoryview(data)
+    operation = str(view[start:start + op_length], 'utf-8')
+    body = view[start + op_length:]
+
+    if encoding == ENCODING_ZLIB:
+        body = zlib.decompress(body)
+    elif encoding != ENCODING_IDENTITY:
+        raise ProtocolError(f"Codificación desconocida: {encoding}")
+
+    return Frame(operation, str(body, 'utf-8', 'surrogatepass'), status, flags)
@@ -1,4 +1,5 @@
 import threading
+import multiprocessing
 import time
 import os
 from urllib.parse import urlparse
@@ -6,6 +7,19 @@ import amqpstorm
 from amqpstorm import Message
 import logging
 import datetime
+import json
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from cache import ResultCache, cache_key
+from transporte import TRANSPORT_AMQP, TRANSPORT_LOCAL, InProcessServerTransport
+from protocolo import (BATCH_MESSAGE_TYPE, FRAME_CONTENT_TYPE, FRAME_VERSION, FRAME_VERSION_HEADER, FLAG_REPLY,
+                       LANE_BULK, LANE_INTERACTIVE, LANES, STATUS_OK, STATUS_BAD_REQUEST, STREAM_INDEX_HEADER,
+                       STREAM_MESSAGE_TYPE, ProtocolError, deadline_expired, decode_frame, encode_frame, lane_queue)
+from operaciones import (COST_HEAVY, PIPELINE_SEPARATOR, TEXT_OPERATIONS, chunking_mode, get_operation, merge_chunks,
+                         operation_label, operation_stats, split_chunks)
+from metricas import counter, histogram
+from trazas import (TRACE_CLIENT_SEND, TRACE_SERVER_RECEIVE, TRACE_PROCESS_START, TRACE_PROCESS_END,
+                    TRACE_REPLY_PUBLISH, now_us)
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, 
@@ -25,6 +39,17 @@ RABBIT_PORT = 5671  # Puerto para TLS
 RABBIT_SSL = True   # Habilitar SSL para conexión segura
 RPC_QUEUE = 'rpc_queue'
 HEARTBEAT_INTERVAL = 30  # Reducir el intervalo de heartbeat a 30 segundos
+RPC_TRANSPORT = os.environ.get('RPC_TRANSPORT', TRANSPORT_AMQP)  # 'amqp' o 'local' (cliente y servidor en el mismo proceso)
+SERVER_CONSUMERS = int(os.environ.get('SERVER_CONSUMERS', 4))  # Consumidores del carril interactivo (un canal por hilo)
+SERVER_BULK_CONSUMERS = int(os.environ.get('SERVER_BULK_CONSUMERS', 1))  # Consumidores adicionales dedicados al carril masivo
+SERVER_PREFETCH = int(os.environ.get('SERVER_PREFETCH', 1))  # Mensajes sin confirmar por consumidor
+SERVER_PROCESS_WORKERS = int(os.environ.get('SERVER_PROCESS_WORKERS', 0))  # Procesos para operaciones pesadas (0 = desactivado)
+OFFLOAD_THRESHOLD = int(os.environ.get('OFFLOAD_THRESHOLD', 1024 * 1024))  # Caracteres a partir de los cuales se usa el pool de procesos
+RESULT_CACHE_ENTRIES = int(os.environ.get('RESULT_CACHE_ENTRIES', 1024))  # Entradas de la caché de resultados (0 = desactivada)
+RESULT_CACHE_BYTES = int(os.environ.get('RESULT_CACHE_BYTES', 64 * 1024 * 1024))  # Bytes máximos de la caché de resultados
+
+# Lotes: los textos de operaciones "joinable" se unen con este separador
+BATCH_SEPARATOR = "\x00"
 
 # Estado global
 SERVER_STATUS = {
@@ -35,9 +60,26 @@ SERVER_STATUS = {
     "last_reconnect": None
 }
 
-# Clase de Servidor RPC mejorada
-class TextProcessingServer(object):
-    def __init__(self, host, username, password, rpc_queue, vhost, port=5671, ssl=True, heartbeat=30):
+# Métricas del servidor
+SERVER_MESSAGES = counter('textpro_server_messages_total', "Solicitudes procesadas y respondidas")
+SERVER_EXPIRED = counter('textpro_server_expired_total', "Solicitudes descartadas por haber vencido su plazo",
+                         ('stage',))
+SERVER_ERRORS = counter('textpro_server_errors_total', "Errores del servidor RPC")
+PROCESSING_TIME = histogram('textpro_server_processing_seconds', "Tiempo de procesamiento de una solicitud",
+                            ('operation',))
+OFFLOADED = counter('textpro_server_offloaded_total', "Solicitudes procesadas en el pool de procesos")
+OFFLOAD_CHUNKS = counter('textpro_server_offload_chunks_total', "Fragmentos procesados en paralelo en el pool de procesos")
+
+def _record_error(message):
+    """Contar un error del servidor y recordar el último"""
+    SERVER_ERRORS.inc()
+    SERVER_STATUS["last_error"] = message
+
+# Transporte AMQP del servidor
+class AmqpServerTransport(object):
+    """Conexión a RabbitMQ con un consumidor por hilo, cada uno con su propio canal"""
+    def __init__(self, host, username, password, rpc_queue, vhost, port=5671, ssl=True, heartbeat=30,
+                 consumers=1, prefetch=1, connection_factory=amqpstorm.Connection, bulk_consumers=1):
         self.host = host
         self.username = username
         self.password = password
@@ -46,18 +88,27 @@ class TextProcessingServer(object):
         self.port = port
         self.ssl = ssl
         self.heartbeat = heartbeat
+        # Fábrica de conexiones compatible con amqpstorm.Connection (p. ej. un broker local de pruebas)
+        self.connection_factory = connection_factory
+        # Consumidores por carril: el masivo tiene los suyos y nunca ocupa a los interactivos
+        self.lanes = {LANE_INTERACTIVE: max(1, consumers), LANE_BULK: max(1, bulk_consumers)}
+        self.consumers = sum(self.lanes.values())
+        self.prefetch = max(1, prefetch)
+        self.on_request = None
         self.connection = None
         self.channel = None
         self.should_reconnect = True
         self.heartbeat_thread = None
+        self.consumer_threads = []
         
-    def start(self):
-        """Iniciar servidor con manejo de errores"""
+    def serve(self, on_request):
+        """Consumir solicitudes con manejo de errores y reconexión"""
+        self.on_request = on_request
         while self.should_reconnect:
             try:
                 logger.info(f"Conectando a RabbitMQ: {self.host}:{self.port}")
                 # Crear conexión con heartbeat reducido
-                self.connection = amqpstorm.Connection(
+                self.connection = self.connection_factory(
                     self.host, 
                     self.username,
                     self.password,
@@ -67,27 +118,42 @@ class TextProcessingServer(object):
                     heartbeat=self.heartbeat
                 )
                 
-                # Crear canal
+                # Crear canal de control
                 self.channel = self.connection.channel()
                 
-                # Declarar cola
-                self.channel.queue.declare(self.rpc_queue)
-                
-                # Configurar QoS
-                self.channel.basic.qos(prefetch_count=1)
+                # Declarar las colas de todos los carriles
+                for lane in LANES:
+                    self.channel.queue.declare(lane_queue(self.rpc_queue, lane))
                 
                 # Iniciar hilo de heartbeat
                 self._create_heartbeat_thread()
                 
-                # Configurar consumidor
-                self.channel.basic.consume(self._process_request, self.rpc_queue)
+                # Iniciar consumidores, cada uno con su propio canal y la cola de su carril
+                self.consumer_threads = []
+                for lane, count in self.lanes.items():
+                    for _ in range(count):
+                        thread = threading.Thread(target=self._consume,
+                                                  args=(len(self.consumer_threads), lane_queue(self.rpc_queue, lane)))
+                        thread.daemon = True
+                        thread.start()
+                        self.consumer_threads.append(thread)
                 
-                logger.info(f"Iniciado. Esperando mensajes en '{self.rpc_queue}'")
+                logger.info(f"Iniciado. {self.consumers} consumidores esperando mensajes en '{self.rpc_queue}' "
+                            f"(por carril: {self.lanes})")
                 SERVER_STATUS["running"] = True
+                SERVER_STATUS["consumers"] = self.consumers
+                SERVER_STATUS["lanes"] = dict(self.lanes)
                 SERVER_STATUS["last_reconnect"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 
-                # Iniciar consumo
-                self.channel.start_consuming()
+                # Vigilar consumidores; si alguno cae se reconecta todo
+                while self.should_reconnect and self.connection.is_open:
+                    if not all(thread.is_alive() for thread in self.consumer_threads):
+                        raise Exception("Un consumidor se detuvo inesperadamente")
+                    time.sleep(1)
+                
+                if not self.should_reconnect:
+                    self.connection.close()
+                    break
                 
             except KeyboardInterrupt:
                 logger.info("Detenido por el usuario")
@@ -96,8 +162,7 @@ class TextProcessingServer(object):
                 
             except Exception as e:
                 SERVER_STATUS["running"] = False
-                SERVER_STATUS["errors"] += 1
-                SERVER_STATUS["last_error"] = str(e)
+                _record_error(str(e))
                 logger.error(f"Error: {str(e)}")
                 
                 # Limpiar conexiones
@@ -110,6 +175,26 @@ class TextProcessingServer(object):
                 # Esperar antes de reconectar
                 logger.info("Esperando para reconectar...")
                 time.sleep(5)
+        
+        SERVER_STATUS["running"] = False
+    
+    def _consume(self, index, queue_name):
+        """Consumir mensajes de una cola en un canal propio"""
+        try:
+            channel = self.connection.channel()
+            
+            # Configurar QoS
+            channel.basic.qos(prefetch_count=self.prefetch)
+            
+            # Configurar consumidor
+            channel.basic.consume(self.on_request, queue_name)
+            
+            # Iniciar consumo
+            channel.start_consuming()
+        except Exception as e:
+            if self.should_reconnect:
+                _record_error(f"Consumidor {index}: {str(e)}")
+                logger.error(f"Error en consumidor {index}: {str(e)}")
                 
     def _create_heartbeat_thread(self):
         """Crear hilo para enviar heartbeats"""
@@ -136,46 +221,133 @@ class TextProcessingServer(object):
                         }
                     )
             except Exception as e:
-                SERVER_STATUS["errors"] += 1
-                SERVER_STATUS["last_error"] = f"Servidor heartbeat error: {str(e)}"
+                _record_error(f"Servidor heartbeat error: {str(e)}")
                 logger.error(f"Error en heartbeat: {str(e)}")
                 
             # Dormir por menos tiempo que el intervalo de heartbeat
             time.sleep(self.heartbeat // 2)
         
+    def reply(self, request, body, properties):
+        """Publicar la respuesta en la cola indicada por la solicitud"""
+        response_message = Message.create(request.channel, body, properties=properties)
+        
+        # Configurar propiedades
+        response_message.correlation_id = request.correlation_id
+        response_message.properties['delivery_mode'] = 2
+        
+        # Publicar respuesta
+        response_message.publish(routing_key=request.reply_to)
+    
+    def close(self):
+        """Detener el consumo y cerrar la conexión"""
+        self.should_reconnect = False
+        
+# Clase de Servidor RPC mejorada
+class TextProcessingServer(object):
+    def __init__(self, host, username, password, rpc_queue, vhost, port=5671, ssl=True, heartbeat=30,
+                 consumers=1, prefetch=1, process_workers=0, offload_threshold=OFFLOAD_THRESHOLD, cache=None,
+                 transport=None, bulk_consumers=1):
+        self.rpc_queue = rpc_queue
+        self.offload_threshold = offload_threshold
+        self.process_workers = process_workers
+        # Los procesos se crean bajo demanda desde hilos consumidores con conexiones y locks activos:
+        # se arrancan desde un forkserver limpio en lugar de hacer fork del proceso actual
+        self.executor = (ProcessPoolExecutor(max_workers=process_workers,
+                                             mp_context=multiprocessing.get_context('forkserver'))
+                         if process_workers > 0 else None)
+        self.cache = cache
+        # Por defecto se usa RabbitMQ; otro transporte puede inyectarse
+        self.transport = transport or AmqpServerTransport(host, username, password, rpc_queue, vhost, port, ssl,
+                                                          heartbeat, consumers, prefetch,
+                                                          bulk_consumers=bulk_consumers)
+        
+    @property
+    def should_reconnect(self):
+        return self.transport.should_reconnect
+        
+    def start(self):
+        """Iniciar servidor con manejo de errores"""
+        try:
+            self.transport.serve(self._process_request)
+        finally:
+            if self.executor:
+                self.executor.shutdown(wait=False)
+    
+    def stop(self):
+        """Detener el servidor"""
+        self.transport.close()
+        
     def _process_request(self, message):
         """Procesar solicitudes con manejo de errores"""
         try:
             # Extraer payload
+            received = now_us()
             payload = message.body
-            logger.info(f"Solicitud recibida: {payload}")
+            headers = message.properties.get('headers') or {}
+            logger.info(f"Solicitud recibida: {payload[:100]}")
+            
+            # Quien envió la solicitud ya no espera: no gastar tiempo en ella
+            if deadline_expired(headers):
+                self._drop_expired(message, "recepcion")
+                return
+            
+            # Procesar texto, enviando cargas grandes y pesadas al pool de procesos
+            process_start = now_us()
+            started = time.perf_counter()
+            reply_properties = {}
+            if message.message_type == BATCH_MESSAGE_TYPE:
+                operation = "lote"
+                response = json.dumps(process_batch(json.loads(payload)))
+            elif message.message_type == STREAM_MESSAGE_TYPE:
+                # Cada fragmento se procesa en cuanto llega y se responde por separado
+                operation = operation_label(payload.partition(':')[0])
+                response = self._process_text(payload)
+                reply_properties = {
+                    'message_type': STREAM_MESSAGE_TYPE,
+                    'headers': {STREAM_INDEX_HEADER: headers.get(STREAM_INDEX_HEADER)}
+                }
+            elif message.content_type == FRAME_CONTENT_TYPE:
+                operation, response = self._process_frame(payload)
+                reply_properties = {'content_type': FRAME_CONTENT_TYPE}
+            else:
+                parts = payload.split(':', 1)
+                operation = operation_label(parts[0])
+                if len(parts) < 2:
+                    response = "ERROR: Formato inválido. Se espera 'comando:texto'"
+                else:
+                    response = self._process_cached(parts[0].lower(), parts[1])
+            process_end = now_us()
+            PROCESSING_TIME.labels(operation).observe(time.perf_counter() - started)
             
-            # Procesar texto
-            response = self._process_text(payload)
+            # Anunciar el protocolo binario para que el cliente pueda negociarlo
+            reply_headers = reply_properties.setdefault('headers', {})
+            reply_headers[FRAME_VERSION_HEADER] = FRAME_VERSION
             
-            # Crear respuesta
-            response_message = Message.create(
-                message.channel,
-                response
-            )
+            # Devolver las marcas de tiempo de las solicitudes trazadas
+            if TRACE_CLIENT_SEND in headers:
+                reply_headers[TRACE_CLIENT_SEND] = headers[TRACE_CLIENT_SEND]
+                reply_headers[TRACE_SERVER_RECEIVE] = received
+                reply_headers[TRACE_PROCESS_START] = process_start
+                reply_headers[TRACE_PROCESS_END] = process_end
+                reply_headers[TRACE_REPLY_PUBLISH] = now_us()
             
-            # Configurar propiedades
-            response_message.correlation_id = message.correlation_id
-            response_message.properties['delivery_mode'] = 2
+            # Una respuesta que llegaría tarde solo ocupa la cola del cliente
+            if deadline_expired(headers):
+                self._drop_expired(message, "respuesta")
+                return
             
             # Publicar respuesta
-            response_message.publish(routing_key=message.reply_to)
-            logger.info(f"Respuesta enviada: {response}")
+            self.transport.reply(message, response, reply_properties)
+            logger.info(f"Respuesta enviada: {response[:100]}")
             
             # Confirmar mensaje
             message.ack()
             
             # Actualizar estadísticas
-            SERVER_STATUS["processed_messages"] += 1
+            SERVER_MESSAGES.inc()
             
         except Exception as e:
-            SERVER_STATUS["errors"] += 1
-            SERVER_STATUS["last_error"] = str(e)
+            _record_error(str(e))
             logger.error(f"Error procesando solicitud: {str(e)}")
             
             # Intentar confirmar el mensaje
@@ -184,56 +356,175 @@ class TextProcessingServer(object):
             except:
                 pass
         
+    def _drop_expired(self, message, stage):
+        """Confirmar sin responder una solicitud cuyo plazo venció"""
+        SERVER_EXPIRED.labels(stage).inc()
+        logger.info(f"Solicitud vencida descartada en {stage}: {message.correlation_id}")
+        message.ack()
+        
+    def _process_frame(self, data):
+        """Procesar un mensaje binario y devolver (etiqueta de la operación, respuesta codificada)"""
+        try:
+            frame = decode_frame(data)
+        except (ProtocolError, UnicodeDecodeError, zlib.error) as e:
+            return "otra", encode_frame('', str(e), STATUS_BAD_REQUEST, FLAG_REPLY)
+        
+        operation = operation_label(frame.operation)
+        response = self._process_cached(frame.operation.lower(), frame.text)
+        if response.startswith("ERROR:"):
+            return operation, encode_frame(frame.operation, response[len("ERROR:"):].strip(), STATUS_BAD_REQUEST,
+                                           FLAG_REPLY)
+        return operation, encode_frame(frame.operation, response, STATUS_OK, FLAG_REPLY)
+        
+    def _process_cached(self, comando, texto):
+        """Procesar un comando consultando antes la caché de resultados"""
+        key = cache_key(comando, texto) if self.cache else None
+        if key is not None:
+            response = self.cache.get(key)
+            if response is not None:
+                return response
+        
+        if self._should_offload(comando, texto):
+            response = self._run_offloaded(comando, texto)
+        else:
+            response = run_command(comando, texto)
+        
+        # Todas las operaciones son deterministas; los errores no se guardan
+        if key is not None and not response.startswith("ERROR:"):
+            self.cache.put(key, response)
+        return response
+        
+    def _should_offload(self, comando, texto):
+        """Decidir si la solicitud se procesa en el pool de procesos"""
+        if self.executor is None or len(texto) < self.offload_threshold:
+            return False
+        operations = [get_operation(step.strip()) for step in comando.split(PIPELINE_SEPARATOR)]
+        if any(operation is None for operation in operations):
+            return False
+        return any(operation.cost == COST_HEAVY for operation in operations)
+        
+    def _run_offloaded(self, comando, texto):
+        """Ejecutar en el pool de procesos, repartiendo por fragmentos si la operación lo admite"""
+        OFFLOADED.inc()
+        mode = chunking_mode(comando)
+        if mode is None or self.process_workers < 2:
+            return self.executor.submit(run_command, comando, texto).result()
+        
+        # Fragmentos cortados tras un espacio: el resultado combinado es idéntico al del texto completo
+        futures = [self.executor.submit(run_command, comando, chunk)
+                   for chunk in split_chunks(texto, self.process_workers)]
+        results = [future.result() for future in futures]
+        for result in results:
+            if result.startswith("ERROR:"):
+                return result
+        OFFLOAD_CHUNKS.inc(len(results))
+        return merge_chunks(mode, results)
+        
     def _process_text(self, payload):
         """Procesar texto según comando"""
-        try:
-            # Dividir payload
-            parts = payload.split(':', 1)
-            
-            if len(parts) < 2:
-                return "ERROR: Formato inválido. Se espera 'comando:texto'"
-            
-            comando = parts[0].lower()
-            texto = parts[1]
-            
-            # Procesar según comando
-            if comando == "mayusculas":
-                return texto.upper()
-            elif comando == "minusculas":
-                return texto.lower()
-            elif comando == "invertir":
-                return texto[::-1]
-            elif comando == "longitud":
-                return str(len(texto))
-            elif comando == "capitalizar":
-                return texto.capitalize()
-            elif comando == "titulo":
-                return texto.title()
-            elif comando == "intercambiar_caso":
-                return texto.swapcase()
-            elif comando == "contar_palabras":
-                return str(len(texto.split()))
-            elif comando == "recortar":
-                return texto.strip()
-            elif comando == "ayuda":
-                return "Comandos disponibles: mayusculas, minusculas, invertir, longitud, capitalizar, titulo, intercambiar_caso, contar_palabras, recortar"
-            else:
-                return f"ERROR: Comando desconocido '{comando}'"
-        except Exception as e:
-            return f"ERROR: {str(e)}"
+        return process_text(payload)
 
-# Lista de operaciones disponibles (para referencia)
-TEXT_OPERATIONS = [
-    {"id": "mayusculas", "name": "Convertir a MAYÚSCULAS", "icon": "arrow-up-square", "description": "Convierte todo el texto a mayúsculas"},
-    {"id": "minusculas", "name": "Convertir a minúsculas", "icon": "arrow-down-square", "description": "Convierte todo el texto a minúsculas"},
-    {"id": "invertir", "name": "Invertir texto", "icon": "arrow-left-right", "description": "Invierte el orden de los caracteres del texto"},
-    {"id": "longitud", "name": "Longitud del texto", "icon": "rulers", "description": "Cuenta el número de caracteres en el texto"},
-    {"id": "capitalizar", "name": "Capitalizar", "icon": "type-bold", "description": "Convierte a mayúscula la primera letra del texto"},
-    {"id": "titulo", "name": "Formato título", "icon": "card-heading", "description": "Convierte a mayúscula la primera letra de cada palabra"},
-    {"id": "intercambiar_caso", "name": "Intercambiar caso", "icon": "arrow-down-up", "description": "Invierte mayúsculas/minúsculas"},
-    {"id": "contar_palabras", "name": "Contar palabras", "icon": "list-ol", "description": "Cuenta el número de palabras en el texto"},
-    {"id": "recortar", "name": "Recortar espacios", "icon": "scissors", "description": "Elimina espacios al inicio y final del texto"}
-]
+def process_text(payload):
+    """Procesar texto según comando"""
+    try:
+        # Dividir payload
+        parts = payload.split(':', 1)
+        
+        if len(parts) < 2:
+            return "ERROR: Formato inválido. Se espera 'comando:texto'"
+        
+        return run_command(parts[0].lower(), parts[1])
+    except Exception as e:
+        return f"ERROR: {str(e)}"
+
+def run_command(comando, texto):
+    """Ejecutar un comando o una tubería sobre un texto"""
+    try:
+        if PIPELINE_SEPARATOR in comando:
+            return apply_pipeline(comando.split(PIPELINE_SEPARATOR), texto)
+        return apply_operation(comando, texto)
+    except Exception as e:
+        return f"ERROR: {str(e)}"
+
+def fuse_pipeline(steps):
+    """Simplificar una tubería eliminando pasos sin efecto en el resultado final"""
+    fused = []
+    for step in steps:
+        operation = get_operation(step)
+        if operation is None:
+            fused.append(step)
+            continue
+        if fused and step == fused[-1]:
+            # Repetir una operación idempotente no cambia nada
+            if operation.idempotent:
+                continue
+            # Invertir dos veces deja el texto igual
+            if step == "invertir":
+                fused.pop()
+                continue
+        if step == "contar_palabras":
+            while fused and _preserves(fused[-1], 'preserves_words'):
+                fused.pop()
+        elif step == "longitud":
+            while fused and _preserves(fused[-1], 'preserves_length'):
+                fused.pop()
+        fused.append(step)
+    return fused
+
+def _preserves(step, attribute):
+    """Indicar si un paso conserva la propiedad dada del texto"""
+    operation = get_operation(step)
+    return operation is not None and getattr(operation, attribute)
+
+def apply_pipeline(steps, texto):
+    """Aplicar una secuencia de comandos, devolviendo solo el resultado final"""
+    steps = [step.strip() for step in steps]
+    if not all(steps):
+        return "ERROR: Tubería inválida. Se espera 'comando1|comando2:texto'"
+    
+    for step in fuse_pipeline(steps):
+        texto = apply_operation(step, texto)
+        if texto.startswith("ERROR:"):
+            return texto
+    return texto
+
+def apply_operation(comando, texto):
+    """Aplicar un comando a un texto"""
+    operation = get_operation(comando)
+    if operation is None:
+        return f"ERROR: Comando desconocido '{comando}'"
+    try:
+        return operation(texto)
+    except Exception as e:
+        return f"ERROR: {str(e)}"
+
+def process_batch(items):
+    """Procesar un lote [{operation, text}, ...] devolviendo los resultados en orden"""
+    results = [None] * len(items)
+    
+    # Agrupar índices por operación
+    groups = {}
+    for index, item in enumerate(items):
+        groups.setdefault(str(item.get('operation', '')).lower(), []).append(index)
+    
+    for comando, indices in groups.items():
+        textos = [str(items[i].get('text', '')) for i in indices]
+        
+        # Aplicar la operación una sola vez sobre todo el grupo cuando es seguro
+        operation = get_operation(comando)
+        if (operation is not None and operation.joinable and len(textos) > 1
+                and not any(BATCH_SEPARATOR in texto for texto in textos)):
+            partes = apply_operation(comando, BATCH_SEPARATOR.join(textos)).split(BATCH_SEPARATOR)
+            if comando == "invertir":
+                partes.reverse()
+        else:
+            # Comandos simples o tuberías, igual que en el resto de rutas
+            partes = [run_command(comando, texto) for texto in textos]
+        
+        for i, resultado in zip(indices, partes):
+            results[i] = resultado
+    
+    return results
 
 # Variable global para servidor
 SERVER_INSTANCE = None
@@ -246,8 +537,8 @@ def init_server():
     logger.info("Iniciando servidor RPC...")
     
     # Detener servidor existente
-    if SERVER_INSTANCE and hasattr(SERVER_INSTANCE, 'should_reconnect'):
-        SERVER_INSTANCE.should_reconnect = False
+    if SERVER_INSTANCE:
+        SERVER_INSTANCE.stop()
     
     if SERVER_THREAD and SERVER_THREAD.is_alive():
         logger.info("Esperando que el servidor anterior se detenga...")
@@ -262,7 +553,16 @@ def init_server():
         RABBIT_VHOST,
         RABBIT_PORT,
         RABBIT_SSL,
-        HEARTBEAT_INTERVAL
+        HEARTBEAT_INTERVAL,
+        consumers=SERVER_CONSUMERS,
+        bulk_consumers=SERVER_BULK_CONSUMERS,
+        prefetch=SERVER_PREFETCH,
+        process_workers=SERVER_PROCESS_WORKERS,
+        offload_threshold=OFFLOAD_THRESHOLD,
+        cache=ResultCache(RESULT_CACHE_ENTRIES, RESULT_CACHE_BYTES) if RESULT_CACHE_ENTRIES > 0 else None,
+        transport=(InProcessServerTransport(RPC_QUEUE, SERVER_CONSUMERS, SERVER_STATUS,
+                                            bulk_consumers=SERVER_BULK_CONSUMERS)
+                   if RPC_TRANSPORT == TRANSPORT_LOCAL else None)
     )
     
     # Crear e iniciar hilo de servidor
@@ -278,6 +578,13 @@ def init_server():
 
 def get_server_status():
     """Obtener estado del servidor"""
+    SERVER_STATUS["processed_messages"] = SERVER_MESSAGES.value
+    SERVER_STATUS["errors"] = SERVER_ERRORS.value
+    SERVER_STATUS["offloaded"] = {"requests": OFFLOADED.value, "chunks": OFFLOAD_CHUNKS.value}
+    SERVER_STATUS["expired"] = {stage: SERVER_EXPIRED.labels(stage).value for stage in ("recepcion", "respuesta")}
+    if SERVER_INSTANCE and SERVER_INSTANCE.cache:
+        SERVER_STATUS["cache"] = SERVER_INSTANCE.cache.stats()
+    SERVER_STATUS["operations"] = operation_stats()
     return SERVER_STATUS
 
 # Si se ejecuta directamente, iniciar servidor
@@ -292,4 +599,4 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         logger.info("Deteniendo servidor...")
         if SERVER_INSTANCE:
-            SERVER_INSTANCE.should_reconnect = False
+            SERVER_INSTANCE.stop()
@@ -270,6 +270,49 @@ function updateUIBasedOnConnection(connected = null) {
     }
 }
 
+/**
+ * Enviar el formulario como trabajo asíncrono y esperar su resultado
+ * @param {HTMLFormElement} form - Formulario con la operación y el texto
+ * @returns {Promise<Object>} Trabajo terminado ({operation, result})
+ */
+function submitJob(form) {
+    return fetch('/jobs', {
+        method: 'POST',
+        body: new FormData(form),
+        headers: {
+            'X-Requested-With': 'XMLHttpRequest'
+        }
+    })
+    .then(response => response.json().then(data => {
+        if (!response.ok) {
+            const retryAfter = response.headers.get('Retry-After');
+            throw new Error((data.error || 'Error al enviar la solicitud') +
+                            (retryAfter ? ` (reintentar en ${retryAfter} s)` : ''));
+        }
+        return data;
+    }))
+    .then(job => waitForJob(job.poll_url));
+}
+
+/**
+ * Consultar un trabajo por long-poll hasta que termine
+ * @param {string} pollUrl - URL del trabajo
+ * @returns {Promise<Object>} Trabajo terminado
+ */
+function waitForJob(pollUrl) {
+    return fetch(pollUrl + '?wait=10')
+        .then(response => response.json())
+        .then(job => {
+            if (job.status === 'pending') {
+                return waitForJob(pollUrl);
+            }
+            if (!job.success) {
+                throw new Error(job.error || 'Error al procesar la solicitud');
+            }
+            return job;
+        });
+}
+
 /**
  * Mostrar el resultado de una operación
  * @param {string} operation - Nombre de la operación
@@ -0,0 +1,113 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# Trabajos asíncronos: el envío devuelve un id y el resultado se consulta después
+JOB_MAX_ENTRIES = int(os.environ.get('JOB_MAX_ENTRIES', 10000))  # Trabajos conservados en memoria
+JOB_RESULT_TTL = float(os.environ.get('JOB_RESULT_TTL', 300))  # Segundos que se conserva un resultado ya entregado
+
+# Estados de un trabajo
+JOB_PENDING = 'pending'
+JOB_DONE = 'done'
+JOB_EXPIRED = 'expired'
+
+class Job(object):
+    """Solicitud RPC en curso identificada por su correlation_id"""
+    __slots__ = ('id', 'operation', 'text', 'deadline', 'result', 'finished_at', '_cond')
+
+    def __init__(self, id, operation, text, timeout):
+        self.id = id
+        self.operation = operation
+        self.text = text
+        self.deadline = time.monotonic() + timeout
+        self.result = None
+        self.finished_at = None
+        self._cond = threading.Condition()
+
+    @property
+    def status(self):
+        if self.finished_at is not None:
+            return JOB_DONE
+        return JOB_EXPIRED if time.monotonic() > self.deadline else JOB_PENDING
+
+    def finish(self, result):
+        """Guardar el resultado y despertar a quien espera; devuelve False si ya había terminado"""
+        with self._cond:
+            first = self.finished_at is None
+            if first:
+                self.result = result
+                self.finished_at = time.monotonic()
+            self._cond.notify_all()
+        return first
+
+    def wait(self, timeout):
+        """Esperar hasta que termine, venza o pase el timeout; devuelve el estado"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.status != JOB_PENDING,
+                                max(0, min(timeout, self.deadline - time.monotonic())))
+        return self.status
+
+    def to_dict(self):
+        """Representación JSON del trabajo"""
+        status = self.status
+        data = {'job_id': self.id, 'status': status, 'operation': self.operation}
+        if status == JOB_DONE:
+            data['success'] = True
+            data['result'] = self.result
+        elif status == JOB_EXPIRED:
+            data['success'] = False
+            data['error'] = 'Tiempo de espera agotado. No se recibió respuesta del servidor'
+        return data
+
+# Almacén de trabajos por correlation_id
+class JobStore(object):
+    """Trabajos recientes con tamaño máximo; los terminados caducan tras JOB_RESULT_TTL"""
+    def __init__(self, max_entries=JOB_MAX_ENTRIES, result_ttl=JOB_RESULT_TTL):
+        self.max_entries = max_entries
+        self.result_ttl = result_ttl
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, client, corr_id, operation, text, timeout, on_finish=None):
+        """Registrar un trabajo y completarlo cuando llegue la respuesta; on_finish(job) se llama una vez al terminar"""
+        job = Job(corr_id, operation, text, timeout)
+        with self._lock:
+            self._expire(time.monotonic())
+            while len(self._jobs) >= self.max_entries:
+                self._jobs.popitem(last=False)
+            self._jobs[corr_id] = job
+
+        def deliver(result):
+            if job.finish(result) and on_finish:
+                on_finish(job)
+
+        if not client.on_reply(corr_id, deliver):
+            job.finish("ERROR: La solicitud ya no está pendiente")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _expire(self, now):
+        """Eliminar desde el más antiguo los trabajos terminados o vencidos hace más de result_ttl (requiere el lock)"""
+        while self._jobs:
+            job = next(iter(self._jobs.values()))
+            if (job.finished_at or job.deadline) + self.result_ttl >= now:
+                break
+            self._jobs.popitem(last=False)
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def stats(self):
+        """Estadísticas del almacén"""
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            "jobs": len(statuses),
+            "pending": statuses.count(JOB_PENDING),
+            "done": statuses.count(JOB_DONE),
+            "expired": statuses.count(JOB_EXPIRED)
+        }
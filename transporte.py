@@ -0,0 +1,162 @@
+import threading
+import queue
+import uuid
+import logging
+from protocolo import LANE_BULK, LANE_INTERACTIVE, lane_queue
+
+logger = logging.getLogger("transporte")
+
+# Transportes disponibles para RpcClient y TextProcessingServer
+TRANSPORT_AMQP = 'amqp'
+TRANSPORT_LOCAL = 'local'
+
+# Mensaje entregado por el transporte en proceso
+class LocalMessage(object):
+    """Mensaje con la misma interfaz que amqpstorm.Message usada por cliente y servidor"""
+    __slots__ = ('body', 'properties', 'channel')
+
+    def __init__(self, body, properties):
+        self.body = body
+        self.properties = properties
+        self.channel = None
+
+    @property
+    def correlation_id(self):
+        return self.properties.get('correlation_id')
+
+    @property
+    def reply_to(self):
+        return self.properties.get('reply_to')
+
+    @property
+    def message_type(self):
+        return self.properties.get('message_type')
+
+    @property
+    def content_type(self):
+        return self.properties.get('content_type')
+
+    def ack(self):
+        """Las colas en proceso no necesitan confirmación"""
+        pass
+
+# Broker mínimo en memoria: colas con nombre y manejadores de respuesta directos
+class InProcessBroker(object):
+    """Colas en memoria compartidas por cliente y servidor del mismo proceso"""
+    def __init__(self):
+        self._queues = {}
+        self._reply_handlers = {}
+        self._lock = threading.Lock()
+
+    def declare(self, name):
+        """Obtener (o crear) una cola de solicitudes"""
+        with self._lock:
+            if name not in self._queues:
+                self._queues[name] = queue.Queue()
+            return self._queues[name]
+
+    def register_reply_handler(self, callback):
+        """Registrar un destino de respuestas y devolver su nombre"""
+        name = f"local.reply.{uuid.uuid4()}"
+        with self._lock:
+            self._reply_handlers[name] = callback
+        return name
+
+    def unregister_reply_handler(self, name):
+        with self._lock:
+            self._reply_handlers.pop(name, None)
+
+    def publish(self, body, routing_key, properties):
+        """Entregar un mensaje: las respuestas van directo al callback, el resto a su cola"""
+        message = LocalMessage(body, properties)
+        handler = self._reply_handlers.get(routing_key)
+        if handler is not None:
+            handler(message)
+            return
+        self.declare(routing_key).put(message)
+
+# Broker compartido por el proceso
+LOCAL_BROKER = InProcessBroker()
+
+# Transporte en proceso del lado cliente
+class InProcessClientTransport(object):
+    """Publica solicitudes en una cola en memoria y recibe respuestas por callback"""
+    reply_mode = 'local'
+
+    def __init__(self, rpc_queue, broker=LOCAL_BROKER):
+        self.rpc_queue = rpc_queue
+        self.broker = broker
+        self.reply_to = None
+
+    def open(self, on_response, on_failure=None, on_connect=None):
+        """Registrar el manejador de respuestas; la entrega en memoria no falla ni se reconecta"""
+        if self.reply_to is None:
+            self.broker.declare(self.rpc_queue)
+            self.reply_to = self.broker.register_reply_handler(on_response)
+        return True
+
+    def is_connected(self):
+        return self.reply_to is not None
+
+    def publish(self, body, properties, routing_key):
+        """Publicar una solicitud"""
+        properties['reply_to'] = self.reply_to
+        self.broker.publish(body, routing_key, properties)
+
+    def queue_depth(self):
+        """Solicitudes pendientes en la cola en memoria"""
+        return self.broker.declare(self.rpc_queue).qsize()
+
+    def reconnect(self):
+        pass
+
+    def close(self):
+        if self.reply_to is not None:
+            self.broker.unregister_reply_handler(self.reply_to)
+            self.reply_to = None
+
+# Transporte en proceso del lado servidor
+class InProcessServerTransport(object):
+    """Consume solicitudes de las colas en memoria de cada carril con varios hilos"""
+    def __init__(self, rpc_queue, consumers=1, status=None, broker=LOCAL_BROKER, bulk_consumers=1):
+        self.rpc_queue = rpc_queue
+        self.lanes = {LANE_INTERACTIVE: max(1, consumers), LANE_BULK: max(1, bulk_consumers)}
+        self.consumers = sum(self.lanes.values())
+        self.status = status if status is not None else {}
+        self.broker = broker
+        self.should_reconnect = True
+
+    def serve(self, on_request):
+        """Consumir solicitudes hasta que se detenga el transporte"""
+        threads = []
+        for lane, count in self.lanes.items():
+            requests = self.broker.declare(lane_queue(self.rpc_queue, lane))
+            for _ in range(count):
+                thread = threading.Thread(target=self._consume, args=(requests, on_request))
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+
+        logger.info(f"Transporte en proceso: {self.consumers} consumidores en '{self.rpc_queue}' (por carril: {self.lanes})")
+        self.status["running"] = True
+        self.status["consumers"] = self.consumers
+        self.status["lanes"] = dict(self.lanes)
+        for thread in threads:
+            thread.join()
+        self.status["running"] = False
+
+    def _consume(self, requests, on_request):
+        while self.should_reconnect:
+            try:
+                message = requests.get(timeout=1)
+            except queue.Empty:
+                continue
+            on_request(message)
+
+    def reply(self, request, body, properties):
+        """Entregar la respuesta al cliente que hizo la solicitud"""
+        properties['correlation_id'] = request.correlation_id
+        self.broker.publish(body, request.reply_to, properties)
+
+    def close(self):
+        self.should_reconnect = False
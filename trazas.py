@@ -0,0 +1,84 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+
+# Trazas de solicitudes RPC muestreadas: marcas de tiempo en cabeceras a cada salto
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0.01))  # Fracción de solicitudes trazadas (0 = desactivado)
+TRACE_BUFFER_SIZE = int(os.environ.get('TRACE_BUFFER_SIZE', 256))  # Trazas recientes conservadas en memoria
+
+# Cabeceras con marcas en microsegundos desde la época (enteros: AMQP codifica los float con precisión simple)
+TRACE_CLIENT_SEND = 'x-trace-client-send'
+TRACE_SERVER_RECEIVE = 'x-trace-server-receive'
+TRACE_PROCESS_START = 'x-trace-process-start'
+TRACE_PROCESS_END = 'x-trace-process-end'
+TRACE_REPLY_PUBLISH = 'x-trace-reply-publish'
+TRACE_HEADERS = (TRACE_CLIENT_SEND, TRACE_SERVER_RECEIVE, TRACE_PROCESS_START, TRACE_PROCESS_END, TRACE_REPLY_PUBLISH)
+
+# Etapas medidas entre marcas consecutivas; las que cruzan procesos dependen de la sincronía de relojes
+TRACE_STAGES = ('cola', 'recepcion', 'procesamiento', 'respuesta', 'transito_respuesta', 'entrega')
+
+def now_us():
+    """Marca de tiempo actual en microsegundos"""
+    return time.time_ns() // 1000
+
+def should_sample(rate=None):
+    """Decidir si una solicitud se traza"""
+    rate = TRACE_SAMPLE_RATE if rate is None else rate
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+def build_trace(corr_id, operation, headers, client_receive, client_wake):
+    """Construir la traza de una solicitud a partir de las cabeceras de la respuesta"""
+    stamps = [headers.get(name) for name in TRACE_HEADERS] + [client_receive, client_wake]
+    if any(stamp is None for stamp in stamps):
+        return None
+    stages = {name: (end - start) / 1000 for name, start, end in zip(TRACE_STAGES, stamps, stamps[1:])}
+    return {
+        "corr_id": corr_id,
+        "operation": operation,
+        "started_at": stamps[0],
+        "total_ms": (stamps[-1] - stamps[0]) / 1000,
+        "stages_ms": stages
+    }
+
+# Búfer circular de trazas recientes
+class TraceBuffer(object):
+    """Últimas trazas completas con resumen por etapa"""
+    def __init__(self, size=TRACE_BUFFER_SIZE):
+        self._traces = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, trace):
+        with self._lock:
+            self._traces.append(trace)
+
+    def recent(self, limit=None):
+        """Trazas más recientes primero"""
+        with self._lock:
+            traces = list(self._traces)
+        traces.reverse()
+        return traces[:limit] if limit else traces
+
+    def summary(self):
+        """Media y percentiles por etapa, con la etapa que más tiempo consume"""
+        traces = self.recent()
+        stages = {}
+        for name in TRACE_STAGES:
+            values = sorted(trace["stages_ms"][name] for trace in traces)
+            if not values:
+                continue
+            stages[name] = {
+                "mean_ms": sum(values) / len(values),
+                "p50_ms": values[len(values) // 2],
+                "p95_ms": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "max_ms": values[-1]
+            }
+        hot_stage = max(stages, key=lambda name: stages[name]["mean_ms"]) if stages else None
+        return {"count": len(traces), "sample_rate": TRACE_SAMPLE_RATE, "hot_stage": hot_stage, "stages": stages}
+
+    def clear(self):
+        with self._lock:
+            self._traces.clear()
+
+TRACES = TraceBuffer()
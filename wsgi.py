@@ -2,6 +2,10 @@ import logging
 import threading
 import time
 import os
+
+# Cliente y servidor comparten este proceso: usar el transporte en memoria salvo que se indique otro
+os.environ.setdefault('RPC_TRANSPORT', 'local')
+
 from cliente import init_client, get_client_status
 from server import init_server, get_server_status
 from app import app